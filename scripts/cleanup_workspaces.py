@@ -79,6 +79,7 @@ def main():
     print("清理完成！")
     print()
     print(f"扫描: {report['scanned']} 个工作目录")
+    print(f"过期: {report['expired']} 个")
     print(f"删除: {report['deleted']} 个")
     print(f"失败: {report['failed']} 个")
     print(f"释放空间: {report['total_size_mb']:.2f} MB")
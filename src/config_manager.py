@@ -89,6 +89,11 @@ class ConfigManager:
         "init_message_template": (str, False),
         "max_size_mb": (int, False),
         "warn_size_mb": (int, False),
+        "parallel_copy_workers": (int, False),
+        "seed_mode": (str, False),
+        "use_native_copy": (bool, False),
+        "size_cache_ttl": (int, False),
+        "cleanup_workers": (int, False),
     }
 
     def __init__(self, instance_path: Path | str):
@@ -663,6 +668,14 @@ class ConfigManager:
                     field="workspace.warn_size_mb"
                 )
 
+        if "cleanup_sample_fraction" in workspace_config:
+            value = workspace_config["cleanup_sample_fraction"]
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or not 0 < value <= 1:
+                raise ConfigValidationError(
+                    "cleanup_sample_fraction 必须是 (0, 1] 范围内的数值",
+                    field="workspace.cleanup_sample_fraction"
+                )
+
     def _validate_server_config(self, server_name: str, server_type: str, config: dict[str, Any]) -> bool:
         """验证 MCP 服务器配置的完整性"""
         # 验证类型
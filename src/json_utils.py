@@ -0,0 +1,87 @@
+"""
+JSON 编解码模块
+
+提供统一的 JSON 序列化/反序列化函数：
+- 优先使用 orjson（C 实现，直接输出 UTF-8 bytes）
+- orjson 未安装时回退到标准库 json（ensure_ascii=False）
+
+两种实现对常规 JSON 数据（str/int/float/bool/None/list/dict）结果等价，
+但存在以下差异，调用方不应依赖：
+- 紧凑输出分隔符不同：orjson 为 {"a":1}，标准库为 {"a": 1}
+- datetime/date/UUID/dataclass：orjson 直接序列化为字符串/对象，标准库抛出 TypeError
+- NaN/Infinity：orjson 序列化为 null 且拒绝解析，标准库输出并接受非标准的 NaN/Infinity
+- 超出 64 位的整数：orjson 序列化时抛出 JSONEncodeError（TypeError 子类），
+  解析时转为 float；标准库保持任意精度整数
+- 非 str 键：orjson（OPT_NON_STR_KEYS）还会转换 datetime/UUID/枚举等键，
+  标准库仅转换 int/float/bool/None 键，其余抛出 TypeError
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 解析失败时抛出的异常类型（orjson.JSONDecodeError 是 json.JSONDecodeError 的子类）
+JSONDecodeError = json.JSONDecodeError
+
+
+def dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """
+    序列化对象为 UTF-8 编码的 JSON bytes
+
+    Args:
+        obj: 待序列化对象
+        indent: 是否使用 2 空格缩进
+
+    Returns:
+        JSON bytes
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """
+    序列化对象为 JSON 字符串
+
+    Args:
+        obj: 待序列化对象
+        indent: 是否使用 2 空格缩进
+
+    Returns:
+        JSON 字符串
+    """
+    if orjson is not None:
+        return dumps_bytes(obj, indent=indent).decode("utf-8")
+
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None)
+
+
+def loads(data: str | bytes | bytearray | memoryview) -> Any:
+    """
+    反序列化 JSON 字符串或 bytes
+
+    Args:
+        data: JSON 文本（str 或 UTF-8 bytes）
+
+    Returns:
+        解析后的对象
+
+    Raises:
+        JSONDecodeError: JSON 格式无效
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
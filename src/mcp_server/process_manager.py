@@ -38,9 +38,8 @@ class ProcessManager:
         self.instance_path = Path(instance_path)
         self._process: Optional[subprocess.Popen] = None
         self._server_config: Optional[Dict[str, Any]] = None
-
-        # 注册退出处理器
-        atexit.register(self.shutdown)
+        # 关闭标记，防止 shutdown 被重复执行（退出处理统一由 ProcessManagerRegistry 负责）
+        self._shutdown_done = False
 
     def start_server(self) -> Dict[str, Any]:
         """
@@ -49,10 +48,13 @@ class ProcessManager:
         Returns:
             MCP 服务器配置字典（stdio 格式）
         """
-        if self._process is not None:
+        if self._process is not None and self._process.poll() is None and self._server_config is not None:
             logger.warning("MCP 服务器已经运行")
             return self._server_config
 
+        # 残留的进程句柄（已退出或启动未完成），清理后重新启动
+        self._discard_stale_process()
+
         logger.info(f"启动 MCP 服务器进程，实例: {self.instance_path.name}")
 
         try:
@@ -89,12 +91,14 @@ class ProcessManager:
                 }
             }
 
+            self._shutdown_done = False
             logger.info(f"MCP 服务器启动成功，PID: {self._process.pid}")
             return self._server_config
 
         except Exception as e:
             logger.error(f"启动 MCP 服务器失败: {e}")
             self._process = None
+            self._server_config = None
             raise
 
     def start_custom_server(self, cmd: list, server_name: str = "custom") -> Dict[str, Any]:
@@ -108,10 +112,13 @@ class ProcessManager:
         Returns:
             MCP 服务器配置字典（stdio 格式）
         """
-        if self._process is not None:
+        if self._process is not None and self._process.poll() is None and self._server_config is not None:
             logger.warning(f"{server_name} MCP 服务器已经运行")
             return self._server_config
 
+        # 残留的进程句柄（已退出或启动未完成），清理后重新启动
+        self._discard_stale_process()
+
         logger.info(f"启动 {server_name} MCP 服务器进程")
 
         try:
@@ -144,18 +151,31 @@ class ProcessManager:
                 }
             }
 
+            self._shutdown_done = False
             logger.info(f"{server_name} MCP 服务器启动成功，PID: {self._process.pid}")
             return self._server_config
 
         except Exception as e:
             logger.error(f"启动 {server_name} MCP 服务器失败: {e}")
             self._process = None
+            self._server_config = None
             raise
 
+    def _discard_stale_process(self):
+        """清理残留的进程句柄和配置"""
+        if self._process is not None:
+            logger.warning("检测到残留的 MCP 服务器进程句柄，清理后重新启动")
+            if self._process.poll() is None:
+                self._shutdown_done = False
+                self.shutdown()
+        self._process = None
+        self._server_config = None
+
     def shutdown(self):
         """关闭 MCP 服务器进程"""
-        if self._process is None:
+        if self._shutdown_done or self._process is None:
             return
+        self._shutdown_done = True
 
         logger.info("关闭 MCP 服务器进程")
 
@@ -170,7 +190,14 @@ class ProcessManager:
             # 强制关闭
             logger.warning("强制关闭 MCP 服务器")
             self._process.kill()
-            self._process.wait()
+            try:
+                self._process.wait()
+            except ValueError:
+                # 解释器关闭阶段文件描述符可能已被关闭
+                pass
+        except ValueError:
+            # 解释器关闭阶段文件描述符可能已被关闭
+            pass
         except Exception as e:
             logger.error(f"关闭 MCP 服务器时出错: {e}")
         finally:
@@ -212,6 +239,9 @@ class ProcessManager:
 
     def __del__(self):
         """析构函数，确保进程被清理"""
+        # 解释器关闭阶段由 ProcessManagerRegistry.shutdown_all 统一清理，避免重复终止
+        if sys is None or sys.is_finalizing():
+            return
         self.shutdown()
 
 
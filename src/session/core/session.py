@@ -4,15 +4,29 @@
 表示一次 Agent 执行会话，负责收集消息、更新元数据和统计信息。
 """
 
-import json
+import asyncio
+import logging
+import re
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Optional, List, Dict, Generator
+from collections import deque
+from typing import Any, Optional, List, Deque, Generator
 
 from ...logging_config import get_logger
-from ...error_handling import AgentSystemError
+from ...json_utils import dumps_bytes, loads as json_loads, JSONDecodeError
 from ..utils.session_utils import Statistics
 from ..utils.session_serializer import MessageSerializer
+from ..storage.session_index import SessionIndex
+
+try:
+    from claude_agent_sdk import ToolUseBlock, ToolResultBlock
+except ImportError:
+    # SDK 未安装时使用占位类型，record_message 中的 isinstance 检查保持有效（恒为 False）
+    class ToolUseBlock:  # type: ignore[no-redef]
+        pass
+
+    class ToolResultBlock:  # type: ignore[no-redef]
+        pass
 
 # 新增导入
 try:
@@ -24,6 +38,26 @@ except ImportError:
 
 logger = get_logger(__name__)
 
+# 子实例 session_id 标记 <!--SESSION_ID:xxx-->
+_SESSION_ID_RE = re.compile(r'<!--SESSION_ID:([^>]+)-->')
+_SESSION_ID_RE_B = re.compile(rb'<!--SESSION_ID:([^>]+)-->')
+
+
+def _splice_json(fields: dict, data_bytes: bytes) -> bytes:
+    """
+    将已编码的消息体作为 "data" 字段拼接到 JSON 对象末尾
+
+    消息体只需编码一次即可复用于 JSONL 记录和总线事件。
+
+    Args:
+        fields: 其余字段（非空）
+        data_bytes: 已编码的消息体
+
+    Returns:
+        完整 JSON 对象的 bytes（不含换行符）
+    """
+    return dumps_bytes(fields)[:-1] + b',"data":' + data_bytes + b'}'
+
 
 class Session:
     """
@@ -33,6 +67,23 @@ class Session:
     支持实时消息推送和异步JSONL写入。
     """
 
+    __slots__ = (
+        "session_id",
+        "session_dir",
+        "metadata",
+        "config",
+        "_type_filter",
+        "_message_bus",
+        "_jsonl_writer",
+        "_messages",
+        "_statistics",
+        "_finalized",
+        "_message_count",
+        "_session_index",
+        "_session_channel",
+        "_instance_channel",
+    )
+
     def __init__(
         self,
         session_id: str,
@@ -40,7 +91,8 @@ class Session:
         metadata: dict,
         config: Optional[dict] = None,
         message_bus: Optional["MessageBus"] = None,  # 新增
-        jsonl_writer: Optional["JSONLWriter"] = None  # 新增
+        jsonl_writer: Optional["JSONLWriter"] = None,  # 新增
+        session_index: Optional[SessionIndex] = None
     ):
         """
         初始化会话对象
@@ -52,18 +104,28 @@ class Session:
             config: 会话记录配置
             message_bus: 消息总线（可选）
             jsonl_writer: 异步 JSONL 写入器（可选）
+            session_index: 会话结束时间索引（可选，finalize 时追加记录）
         """
         self.session_id = session_id
         self.session_dir = session_dir
         self.metadata = metadata
         self.config = config or {}
 
+        # 预计算消息类型过滤集合（None 表示记录所有类型）
+        message_types = self.config.get("message_types")
+        self._type_filter: Optional[frozenset] = frozenset(message_types) if message_types else None
+
         # 新增：MessageBus 和 JSONLWriter
         self._message_bus = message_bus
         self._jsonl_writer = jsonl_writer
+        self._session_index = session_index
+
+        # 预先构建发布频道名称
+        self._session_channel = f"session:{session_id}"
+        self._instance_channel = f"instance:{metadata.get('instance_name')}"
 
         # 内存中收集所有消息（降级时使用）
-        self._messages: List[Dict[str, Any]] = []
+        self._messages: Deque[bytes] = deque()
         self._statistics = Statistics()
         self._finalized = False
 
@@ -76,9 +138,9 @@ class Session:
         self.session_dir.mkdir(parents=True, exist_ok=True)
 
         # 写入初始元数据
+        # 文件 I/O 放到线程中执行，避免阻塞事件循环
         metadata_file = self.session_dir / "metadata.json"
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, indent=2, ensure_ascii=False)
+        await asyncio.to_thread(metadata_file.write_bytes, dumps_bytes(self.metadata, indent=True))
 
         # JSONLWriter 在 __init__ 中已经自动启动了后台任务
 
@@ -99,32 +161,40 @@ class Session:
         """
         # 检查消息类型过滤
         message_type = type(message).__name__
-        message_types = self.config.get("message_types")
-        if message_types and message_type not in message_types:
+        if self._type_filter is not None and message_type not in self._type_filter:
             return  # 跳过不需要记录的消息类型
 
-        # 1. 序列化消息
-        message_data = {
-            "seq": self._message_count,
-            "timestamp": datetime.now().isoformat(),
-            "message_type": message_type,
-            "data": MessageSerializer.serialize_message(message)
-        }
+        timestamp = datetime.now().isoformat()
+        seq = self._message_count
 
-        # 2. 发布到 Redis（实时）
-        if self._message_bus:
-            await self._publish_to_bus(message_data)
-
-        # 3. 异步写入 JSONL
-        if self._jsonl_writer:
-            await self._jsonl_writer.write(message_data)
-        else:
-            # 降级：保存到内存（兼容旧逻辑）
-            self._messages.append({
-                "seq": self._message_count,
-                "timestamp": message_data["timestamp"],
-                "message": message
-            })
+        # 1. 序列化消息：消息体只编码一次，JSONL 记录与总线事件共用同一份 bytes
+        try:
+            data_bytes = MessageSerializer.serialize_message_bytes(message)
+            record = _splice_json(
+                {"seq": seq, "timestamp": timestamp, "message_type": message_type},
+                data_bytes
+            )
+        except (TypeError, ValueError) as e:
+            logger.error(f"序列化消息失败: {e}，跳过该消息的记录与推送")
+            data_bytes = record = None
+
+        if record is not None:
+            # 2. 发布到 Redis（实时） + 3. 异步写入 JSONL
+            # 两者互不依赖，同时存在时并发执行；总线未连接时完全跳过发布
+            publish = self._message_bus is not None and self._message_bus.is_connected
+            if publish and self._jsonl_writer:
+                await asyncio.gather(
+                    self._publish_to_bus(seq, timestamp, message_type, data_bytes),
+                    self._jsonl_writer.write(record)
+                )
+            elif publish:
+                await self._publish_to_bus(seq, timestamp, message_type, data_bytes)
+            elif self._jsonl_writer:
+                await self._jsonl_writer.write(record)
+
+            if not self._jsonl_writer:
+                # 降级：以编码后的 JSONL 行保存到内存，不再持有原始 SDK 消息对象
+                self._messages.append(record + b'\n')
 
         # 4. 更新计数器
         self._message_count += 1
@@ -132,83 +202,73 @@ class Session:
         # 5. 更新统计信息
         self._statistics.num_messages += 1
 
-        # 检查是否是工具调用
+        # 单次遍历内容块：统计工具调用，并检测子实例工具调用的 session_id
         if message_type == "AssistantMessage":
-            from claude_agent_sdk import ToolUseBlock
+            statistics = self._statistics
+            # 只记录子实例工具（包含 "sub_claude_"）的调用，没有子实例调用时
+            # 映射保持为空，后续 ToolResultBlock 直接跳过
+            sub_tool_use_map = None
             for block in message.content:
                 if isinstance(block, ToolUseBlock):
-                    self._statistics.num_tool_calls += 1
                     tool_name = block.name
-                    self._statistics.tools_used[tool_name] = \
-                        self._statistics.tools_used.get(tool_name, 0) + 1
-
-        # ✅ 检测子实例工具调用并记录 session_id
-        if message_type == "AssistantMessage":
-            self._detect_and_record_subsession(message)
-
-    async def _publish_to_bus(self, message_data: dict) -> None:
+                    statistics.num_tool_calls += 1
+                    statistics.tools_used[tool_name] = statistics.tools_used.get(tool_name, 0) + 1
+                    if "sub_claude_" in tool_name:
+                        if sub_tool_use_map is None:
+                            sub_tool_use_map = {}
+                        sub_tool_use_map[block.id] = tool_name
+
+                elif sub_tool_use_map and isinstance(block, ToolResultBlock):
+                    tool_name = sub_tool_use_map.get(block.tool_use_id)
+                    if tool_name:
+                        sub_session_id = self._extract_session_id_from_result(block)
+                        if sub_session_id:
+                            statistics.subsessions.append({
+                                "session_id": sub_session_id,
+                                "tool_name": tool_name,
+                                "tool_use_id": block.tool_use_id,
+                                "timestamp": timestamp
+                            })
+                            logger.info(f"检测到子实例调用: {tool_name} -> {sub_session_id}")
+
+    async def _publish_to_bus(self, seq: int, timestamp: str, message_type: str, data_bytes: bytes) -> None:
         """
         发布消息到 Redis
 
         Args:
-            message_data: 序列化后的消息数据
+            seq: 消息序号
+            timestamp: 消息时间戳
+            message_type: 消息类型
+            data_bytes: 已编码的消息体（JSON bytes）
         """
         if not self._message_bus or not self._message_bus.is_connected:
             return
 
-        event = {
-            "event_type": "message_created",
-            "timestamp": message_data["timestamp"],
-            "instance_name": self.metadata["instance_name"],
-            "session_id": self.session_id,
-            "parent_session_id": self.metadata.get("parent_session_id"),
-            "depth": self.metadata.get("depth", 0),
-            "seq": message_data["seq"],
-            "message_type": message_data["message_type"],
-            "data": message_data["data"]
-        }
-
-        # 发布到多个频道
-        session_channel = f"session:{self.session_id}"
-        instance_channel = f"instance:{self.metadata['instance_name']}"
-
-        logger.info(f"[Session] {self.metadata['instance_name']} 发布消息到频道: {session_channel}")
-        await self._message_bus.publish(session_channel, event)
-
-        logger.info(f"[Session] {self.metadata['instance_name']} 发布消息到频道: {instance_channel}")
-        await self._message_bus.publish(instance_channel, event)
-
-    def _detect_and_record_subsession(self, message: Any) -> None:
-        """
-        检测并记录子实例工具调用
-
-        Args:
-            message: AssistantMessage 对象
-        """
-        from claude_agent_sdk import ToolUseBlock, ToolResultBlock
-
-        # 收集工具调用 ID 和名称的映射
-        tool_use_map = {}
-        for block in message.content:
-            if isinstance(block, ToolUseBlock):
-                tool_use_map[block.id] = block.name
-
-        # 检查工具结果中是否有子实例 session_id
-        for block in message.content:
-            if isinstance(block, ToolResultBlock):
-                tool_name = tool_use_map.get(block.tool_use_id)
-
-                # 只处理子实例工具（包含 "sub_claude_"）
-                if tool_name and "sub_claude_" in tool_name:
-                    sub_session_id = self._extract_session_id_from_result(block)
-                    if sub_session_id:
-                        self._statistics.subsessions.append({
-                            "session_id": sub_session_id,
-                            "tool_name": tool_name,
-                            "tool_use_id": block.tool_use_id,
-                            "timestamp": datetime.now().isoformat()
-                        })
-                        logger.info(f"检测到子实例调用: {tool_name} -> {sub_session_id}")
+        event = _splice_json(
+            {
+                "event_type": "message_created",
+                "timestamp": timestamp,
+                "instance_name": self.metadata["instance_name"],
+                "session_id": self.session_id,
+                "parent_session_id": self.metadata.get("parent_session_id"),
+                "depth": self.metadata.get("depth", 0),
+                "seq": seq,
+                "message_type": message_type
+            },
+            data_bytes
+        )
+
+        # 发布到多个频道（只序列化一次，单次 pipeline 发送）
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"[Session] {self.metadata['instance_name']} 发布消息到频道: "
+                f"{self._session_channel}, {self._instance_channel}"
+            )
+
+        await self._message_bus.publish_many(
+            [self._session_channel, self._instance_channel],
+            event
+        )
 
     def _extract_session_id_from_result(self, tool_result_block: Any) -> Optional[str]:
         """
@@ -221,9 +281,6 @@ class Session:
             session_id 字符串，如果不存在则返回 None
         """
         try:
-            import json
-            import re
-
             # ToolResultBlock.content 可能是字符串或列表
             content = tool_result_block.content
 
@@ -232,17 +289,14 @@ class Session:
                 for block in content:
                     # 检查 TextBlock
                     if hasattr(block, 'text'):
-                        text = block.text
                         # 使用特殊标记 <!--SESSION_ID:xxx-->
-                        match = re.search(r'<!--SESSION_ID:([^>]+)-->', text)
-                        if match:
-                            return match.group(1)
+                        session_id = self._match_session_id(block.text)
+                        if session_id:
+                            return session_id
 
-            # 如果是字符串，直接解析
-            elif isinstance(content, str):
-                match = re.search(r'<!--SESSION_ID:([^>]+)-->', content)
-                if match:
-                    return match.group(1)
+            # 如果是字符串或 bytes，直接解析
+            elif isinstance(content, (str, bytes, bytearray)):
+                return self._match_session_id(content)
 
             return None
 
@@ -250,6 +304,28 @@ class Session:
             logger.debug(f"提取 session_id 失败: {e}")
             return None
 
+    @staticmethod
+    def _match_session_id(text: Any) -> Optional[str]:
+        """
+        在文本中匹配 <!--SESSION_ID:xxx--> 标记
+
+        Args:
+            text: str 或 bytes 文本
+
+        Returns:
+            session_id 字符串，未匹配时返回 None
+        """
+        if isinstance(text, str):
+            match = _SESSION_ID_RE.search(text)
+            return match.group(1) if match else None
+
+        if isinstance(text, (bytes, bytearray)):
+            # bytes 直接匹配，避免整体解码大段工具输出
+            match = _SESSION_ID_RE_B.search(text)
+            return match.group(1).decode('utf-8') if match else None
+
+        return None
+
     async def finalize(self, result_message: Optional[Any] = None) -> None:
         """
         完成会话（强制刷新 + 写入元数据）
@@ -270,8 +346,9 @@ class Session:
             # 降级：一次性写入内存中的消息
             await self._write_messages_to_jsonl()
 
-        # 更新元数据
-        self.metadata['end_time'] = datetime.now().isoformat()
+        # 更新元数据（结束时间与结果时间戳共用同一时间）
+        end_time = datetime.now().isoformat()
+        self.metadata['end_time'] = end_time
 
         if self.metadata.get('status') == 'running':
             self.metadata['status'] = 'completed'
@@ -291,14 +368,13 @@ class Session:
                     self.metadata['results'] = []
                 self.metadata['results'].append({
                     "result": result_message.result[:500],  # 限制长度
-                    "timestamp": datetime.now().isoformat(),
+                    "timestamp": end_time,
                     "is_error": getattr(result_message, 'is_error', False)
                 })
 
-        # 写入元数据
+        # 写入元数据（文件 I/O 放到线程中执行，避免阻塞事件循环）
         metadata_file = self.session_dir / "metadata.json"
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, indent=2, ensure_ascii=False)
+        await asyncio.to_thread(metadata_file.write_bytes, dumps_bytes(self.metadata, indent=True))
 
         # 写入统计信息
         statistics_file = self.session_dir / "statistics.json"
@@ -306,8 +382,14 @@ class Session:
             "session_id": self.session_id,
             **self._statistics.to_dict()
         }
-        with open(statistics_file, 'w', encoding='utf-8') as f:
-            json.dump(statistics_dict, f, indent=2, ensure_ascii=False)
+        await asyncio.to_thread(statistics_file.write_bytes, dumps_bytes(statistics_dict, indent=True))
+
+        # 记录到会话索引（用于快速清理过期会话）
+        if self._session_index:
+            try:
+                await asyncio.to_thread(self._session_index.append, self.session_id, self.metadata['end_time'])
+            except Exception as e:
+                logger.warning(f"写入会话索引失败: {e}")
 
         # 清空内存中的消息，释放内存
         self._messages.clear()
@@ -323,24 +405,23 @@ class Session:
         if not self._messages:
             return
 
+        # 文件 I/O 放到线程中执行，避免阻塞事件循环
+        await asyncio.to_thread(self._write_messages_to_jsonl_sync, list(self._messages))
+
+    def _write_messages_to_jsonl_sync(self, lines: List[bytes]) -> None:
+        """
+        同步写入消息到 messages.jsonl（在工作线程中执行）
+
+        Args:
+            lines: 已编码的 JSONL 行
+        """
         messages_file = self.session_dir / "messages.jsonl"
 
         # 如果文件存在，说明是 resume 模式，使用追加模式
-        mode = 'a' if messages_file.exists() else 'w'
+        mode = 'ab' if messages_file.exists() else 'wb'
 
-        with open(messages_file, mode, encoding='utf-8') as f:
-            for msg_data in self._messages:
-                try:
-                    message_dict = MessageSerializer.serialize_message(msg_data['message'])
-                    json_line = json.dumps({
-                        "seq": msg_data['seq'],
-                        "timestamp": msg_data['timestamp'],
-                        "message_type": type(msg_data['message']).__name__,
-                        "data": message_dict
-                    }, ensure_ascii=False)
-                    f.write(json_line + '\n')
-                except Exception as e:
-                    logger.error(f"序列化消息失败: {e}")
+        with open(messages_file, mode) as f:
+            f.writelines(lines)
 
     def _load_existing_message_count(self) -> int:
         """
@@ -351,19 +432,31 @@ class Session:
         """
         messages_file = self.session_dir / "messages.jsonl"
 
-        if not messages_file.exists():
+        try:
+            if messages_file.stat().st_size == 0:
+                return 0
+        except FileNotFoundError:
             return 0
 
-        # 统计已有消息数量
+        # 统计已有消息数量（按 1 MiB 块读取并统计换行符）
         count = 0
+        last_byte = b''
         try:
-            with open(messages_file, 'r', encoding='utf-8') as f:
-                for _ in f:
-                    count += 1
+            with open(messages_file, 'rb') as f:
+                while True:
+                    buf = f.read(1 << 20)
+                    if not buf:
+                        break
+                    count += buf.count(b'\n')
+                    last_byte = buf[-1:]
         except Exception as e:
             logger.warning(f"读取已有消息数量失败: {e}")
             return 0
 
+        # 最后一行没有换行符时也计为一条
+        if last_byte and last_byte != b'\n':
+            count += 1
+
         return count
 
     def get_messages(
@@ -387,13 +480,13 @@ class Session:
             return
 
         count = 0
-        with open(messages_file, 'r', encoding='utf-8') as f:
+        with open(messages_file, 'rb') as f:
             for line in f:
                 if limit and count >= limit:
                     break
 
                 try:
-                    msg = json.loads(line)
+                    msg = json_loads(line)
 
                     # 过滤消息类型
                     if message_types and msg['message_type'] not in message_types:
@@ -402,8 +495,8 @@ class Session:
                     yield msg
                     count += 1
 
-                except json.JSONDecodeError:
-                    logger.warning(f"跳过无效 JSON 行: {line[:100]}")
+                except JSONDecodeError:
+                    logger.warning(f"跳过无效 JSON 行: {line[:100].decode('utf-8', errors='replace')}")
 
     def get_metadata(self) -> dict:
         """获取元数据"""
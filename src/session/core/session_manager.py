@@ -7,24 +7,145 @@
 import json
 import os
 import shutil
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Optional, List, Dict
 
 from ...logging_config import get_logger
 from ...error_handling import AgentSystemError
+from ...json_utils import loads as json_loads, JSONDecodeError
 from ..utils.session_utils import generate_session_id
 from .session import Session
-from ..storage.jsonl_writer import JSONLWriter
+from ..storage.session_index import SessionIndex
+from ..storage.jsonl_writer import (
+    JSONLWriter,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_FLUSH_INTERVAL,
+    DEFAULT_MAX_BUFFER_BYTES,
+    DEFAULT_MAX_PENDING_BYTES,
+)
 
 # 新增导入
 try:
-    from ..streaming.message_bus import MessageBus
+    from ..streaming.message_bus import MessageBus, _load_config_file as _load_streaming_config
 except ImportError:
     MessageBus = None
+    _load_streaming_config = None
 
 logger = get_logger(__name__)
 
+# 并行读取 metadata.json 的最大线程数
+_METADATA_SCAN_WORKERS = 32
+
+
+def _dir_size(path: Path) -> int:
+    """
+    递归计算目录下所有文件的总大小
+
+    使用 os.scandir，DirEntry 的类型与 stat 信息通常来自目录列表缓存，
+    避免逐个 Path.stat() 的额外系统调用。
+
+    Args:
+        path: 目录路径
+
+    Returns:
+        总字节数
+    """
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        total += _dir_size(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return total
+
+
+def _list_session_dirs(sessions_dir: Path) -> List[Path]:
+    """
+    列出 sessions/ 下的所有会话目录
+
+    使用 os.scandir，目录类型判断来自目录项本身，无需逐个 stat。
+
+    Args:
+        sessions_dir: sessions 目录
+
+    Returns:
+        会话目录列表，sessions 目录不存在时返回空列表
+    """
+    try:
+        with os.scandir(sessions_dir) as entries:
+            return [
+                Path(entry.path)
+                for entry in entries
+                if entry.is_dir(follow_symlinks=False)
+            ]
+    except FileNotFoundError:
+        return []
+
+
+def _read_metadata(session_dir: Path) -> Optional[dict]:
+    """
+    读取会话目录下的 metadata.json
+
+    Args:
+        session_dir: 会话目录
+
+    Returns:
+        元数据字典，文件不存在或无法解析时返回 None
+    """
+    try:
+        return json_loads((session_dir / "metadata.json").read_bytes())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"读取会话元数据失败 ({session_dir.name}): {e}")
+        return None
+
+
+def _read_metadata_batch(session_dirs: List[Path]) -> List[Optional[dict]]:
+    """
+    使用有界线程池并行读取多个会话的 metadata.json
+
+    Args:
+        session_dirs: 会话目录列表
+
+    Returns:
+        与 session_dirs 顺序一致的元数据列表（缺失项为 None）
+    """
+    if len(session_dirs) <= 1:
+        return [_read_metadata(d) for d in session_dirs]
+
+    with ThreadPoolExecutor(max_workers=min(_METADATA_SCAN_WORKERS, len(session_dirs))) as executor:
+        return list(executor.map(_read_metadata, session_dirs))
+
+
+def _parse_end_times(entries: Dict[str, Any]) -> Dict[str, datetime]:
+    """
+    解析会话结束时间（ISO 格式字符串）
+
+    Args:
+        entries: session_id -> end_time 映射
+
+    Returns:
+        session_id -> datetime 映射（无法解析的条目记录警告后跳过）
+    """
+    end_datetimes: Dict[str, datetime] = {}
+    for session_id, end_time in entries.items():
+        try:
+            end_datetimes[session_id] = datetime.fromisoformat(end_time)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"跳过无效的会话结束时间 ({session_id}): {e}")
+    return end_datetimes
+
 
 class SessionManager:
     """
@@ -49,6 +170,10 @@ class SessionManager:
         """
         self.instance_path = Path(instance_path)
         self.sessions_dir = self.instance_path / "sessions"
+        self._instance_name = self.instance_path.name
+
+        # 会话结束时间索引（用于快速清理过期会话）
+        self._session_index = SessionIndex(self.instance_path / "sessions_index.jsonl")
 
         # 新增：MessageBus
         self._message_bus = message_bus
@@ -119,16 +244,17 @@ class SessionManager:
             # TODO: 未来可以从数据库或缓存中查询父会话的 depth 并递增
             depth = 1  # 简化处理，子会话深度为 1
 
-        # 创建元数据
+        # 创建元数据（开始时间与首条提示词共用同一时间戳）
+        now_iso = datetime.now().isoformat()
         metadata = {
             "session_id": session_id,
-            "instance_name": self.instance_path.name,
-            "start_time": datetime.now().isoformat(),
+            "instance_name": self._instance_name,
+            "start_time": now_iso,
             "end_time": None,
             "status": "running",
             "prompts": [{
                 "prompt": initial_prompt[:1000],  # 限制长度
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso
             }],
             "results": [],  # 初始为空，后续在 finalize 时追加
             "depth": depth,
@@ -137,17 +263,7 @@ class SessionManager:
         }
 
         # 创建 JSONLWriter（如果启用了实时流，自动启用异步写入）
-        jsonl_writer = None
-        if self._message_bus:
-            # 从环境变量或配置读取参数
-            batch_size = int(os.getenv("ASYNC_WRITE_BATCH_SIZE", "10"))
-            flush_interval = float(os.getenv("ASYNC_WRITE_FLUSH_INTERVAL", "1.0"))
-
-            jsonl_writer = JSONLWriter(
-                session_dir=session_dir,
-                batch_size=batch_size,
-                flush_interval=flush_interval
-            )
+        jsonl_writer = self._create_jsonl_writer(session_dir) if self._message_bus else None
 
         # 创建会话对象
         session = Session(
@@ -156,25 +272,64 @@ class SessionManager:
             metadata=metadata,
             config=self.config,
             message_bus=self._message_bus,  # 传递 MessageBus（可能为 None）
-            jsonl_writer=jsonl_writer  # 传递 JSONLWriter（可能为 None）
+            jsonl_writer=jsonl_writer,  # 传递 JSONLWriter（可能为 None）
+            session_index=self._session_index
         )
 
         # 启动会话
         await session.start()
 
+        # 增量更新路径缓存
+        self._session_path_cache[session_id] = session_dir
+
         # ✅ 如果是子实例，发布启动通知到父 session 频道
         if parent_session_id and self._message_bus:
             try:
                 await self._notify_parent_of_child_start(
                     parent_session_id=parent_session_id,
                     child_session_id=session_id,
-                    instance_name=self.instance_path.name
+                    instance_name=self._instance_name
                 )
             except Exception as e:
                 logger.warning(f"Failed to notify parent session: {e}")
 
         return session
 
+    @staticmethod
+    def _create_jsonl_writer(session_dir: Path) -> JSONLWriter:
+        """
+        创建 JSONLWriter
+
+        配置优先级：环境变量 > streaming.yaml 的 async_write 段 > 默认值
+
+        Args:
+            session_dir: 会话目录
+
+        Returns:
+            JSONLWriter 实例
+        """
+        config: Dict[str, Any] = {}
+        if _load_streaming_config is not None:
+            try:
+                streaming_config = _load_streaming_config(Path.cwd() / "streaming.yaml") or {}
+                config = streaming_config.get("async_write") or {}
+            except Exception as e:
+                logger.warning(f"加载 streaming.yaml 异步写入配置失败: {e}，使用默认配置")
+
+        return JSONLWriter(
+            session_dir=session_dir,
+            batch_size=int(os.getenv("ASYNC_WRITE_BATCH_SIZE", config.get("batch_size", DEFAULT_BATCH_SIZE))),
+            flush_interval=float(
+                os.getenv("ASYNC_WRITE_FLUSH_INTERVAL", config.get("flush_interval", DEFAULT_FLUSH_INTERVAL))
+            ),
+            max_buffer_bytes=int(
+                os.getenv("ASYNC_WRITE_MAX_BUFFER_BYTES", config.get("max_buffer_bytes", DEFAULT_MAX_BUFFER_BYTES))
+            ),
+            max_pending_bytes=int(
+                os.getenv("ASYNC_WRITE_MAX_PENDING_BYTES", config.get("max_pending_bytes", DEFAULT_MAX_PENDING_BYTES))
+            )
+        )
+
     def _build_session_path_cache(self) -> None:
         """
         构建会话 ID 到路径的缓存
@@ -183,14 +338,9 @@ class SessionManager:
         """
         self._session_path_cache.clear()
 
-        if not self.sessions_dir.exists():
-            return
-
-        for session_dir in self.sessions_dir.iterdir():
-            if session_dir.is_dir():
-                # 从目录名提取 session_id
-                session_id = session_dir.name
-                self._session_path_cache[session_id] = session_dir
+        for session_dir in _list_session_dirs(self.sessions_dir):
+            # 从目录名提取 session_id
+            self._session_path_cache[session_dir.name] = session_dir
 
         logger.debug(f"缓存了 {len(self._session_path_cache)} 个会话路径")
 
@@ -209,16 +359,18 @@ class SessionManager:
             AgentSystemError: 会话不存在
         """
         # 重建缓存（如果需要）
-        if rebuild_cache or not self._session_path_cache:
+        if rebuild_cache:
             self._build_session_path_cache()
 
         # 从缓存查找
         session_dir = self._session_path_cache.get(session_id)
 
         if not session_dir:
-            # 缓存未命中，尝试重建缓存再查找一次
-            self._build_session_path_cache()
-            session_dir = self._session_path_cache.get(session_id)
+            # 缓存未命中：会话目录以 session_id 命名，直接检查一次即可，无需全量扫描
+            candidate = self.sessions_dir / session_id
+            if candidate.is_dir():
+                session_dir = candidate
+                self._session_path_cache[session_id] = candidate
 
         if not session_dir or not session_dir.exists():
             raise AgentSystemError(f"会话不存在: {session_id}")
@@ -232,17 +384,7 @@ class SessionManager:
             metadata = json.load(f)
 
         # 创建 JSONLWriter（用于追加消息）
-        jsonl_writer = None
-        if self._message_bus:
-            # 从环境变量或配置读取参数（与create_session保持一致）
-            batch_size = int(os.getenv("ASYNC_WRITE_BATCH_SIZE", "10"))
-            flush_interval = float(os.getenv("ASYNC_WRITE_FLUSH_INTERVAL", "1.0"))
-
-            jsonl_writer = JSONLWriter(
-                session_dir=session_dir,
-                batch_size=batch_size,
-                flush_interval=flush_interval
-            )
+        jsonl_writer = self._create_jsonl_writer(session_dir) if self._message_bus else None
 
         # 创建 Session 对象（传递所有必要的依赖项）
         session = Session(
@@ -251,7 +393,8 @@ class SessionManager:
             metadata=metadata,
             config=self.config,
             message_bus=self._message_bus,  # 传递 MessageBus（用于消息发布）
-            jsonl_writer=jsonl_writer      # 传递 JSONLWriter（用于消息记录）
+            jsonl_writer=jsonl_writer,     # 传递 JSONLWriter（用于消息记录）
+            session_index=self._session_index
         )
 
         # 设置状态为可追加（重要：允许 resume 时追加消息）
@@ -272,8 +415,6 @@ class SessionManager:
             Claude的session_id (UUID格式) 或 None
         """
         try:
-            import json
-
             # 构建会话目录路径
             session_dir = self.sessions_dir / local_session_id
             if not session_dir.exists():
@@ -287,14 +428,16 @@ class SessionManager:
                 return None
 
             # 查找第一个包含session_id的SystemMessage
-            with open(messages_file, 'r', encoding='utf-8') as f:
+            # 先在原始 bytes 上做廉价过滤，只解析可能包含 session_id 的行
+            with open(messages_file, 'rb') as f:
                 for line in f:
-                    line = line.strip()
-                    if not line:
+                    if b'"session_id"' not in line:
+                        continue
+                    if b'"SystemMessage"' not in line and b'"ResultMessage"' not in line:
                         continue
 
                     try:
-                        message_data = json.loads(line)
+                        message_data = json_loads(line)
                         message_type = message_data.get("message_type")
                         data = message_data.get("data", {})
 
@@ -305,7 +448,7 @@ class SessionManager:
                                 logger.debug(f"找到Claude session_id: {claude_session_id}")
                                 return claude_session_id
 
-                    except json.JSONDecodeError as e:
+                    except JSONDecodeError as e:
                         logger.warning(f"解析消息行失败: {e}")
                         continue
 
@@ -376,21 +519,17 @@ class SessionManager:
         Returns:
             会话信息列表
         """
-        if not self.sessions_dir.exists():
-            return []
-
         sessions = []
 
-        for session_dir in self.sessions_dir.iterdir():
-            if not session_dir.is_dir():
-                continue
+        session_dirs = _list_session_dirs(self.sessions_dir)
 
-            metadata_file = session_dir / "metadata.json"
-            if not metadata_file.exists():
-                continue
+        # 顺带预热路径缓存
+        for session_dir in session_dirs:
+            self._session_path_cache[session_dir.name] = session_dir
 
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
+        for metadata in _read_metadata_batch(session_dirs):
+            if metadata is None:
+                continue
 
             # 过滤状态
             if status and metadata.get('status') != status:
@@ -417,59 +556,93 @@ class SessionManager:
             dry_run: 是否模拟运行（不实际删除）
 
         Returns:
-            清理报告
+            清理报告（failed 为删除失败的会话数量）
         """
         if not self.sessions_dir.exists():
-            return {"deleted": 0, "total_size_mb": 0, "sessions": [], "dry_run": dry_run}
+            return {"deleted": 0, "failed": 0, "total_size_mb": 0, "sessions": [], "dry_run": dry_run}
 
         cutoff_time = datetime.now() - timedelta(days=retention_days)
 
         deleted_count = 0
+        failed_count = 0
         total_size = 0
         deleted_sessions = []
 
-        for session_dir in self.sessions_dir.iterdir():
-            if not session_dir.is_dir():
-                continue
-
-            # 读取元数据
-            metadata_file = session_dir / "metadata.json"
-            if not metadata_file.exists():
-                continue
-
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
+        # 读取会话结束时间索引；索引不存在、含无法解析的行或无效时间值时全量扫描一次并重建（dry_run 时不写盘）
+        # （持锁期间会话完成时的追加会等待，重建完成后再写入，不会遗漏）
+        with nullcontext() if dry_run else self._session_index.locked():
+            index_entries = self._session_index.load()
+            end_datetimes = None
+            if index_entries is not None and not self._session_index.skipped_lines:
+                end_datetimes = _parse_end_times(index_entries)
+            if end_datetimes is None or len(end_datetimes) < len(index_entries):
+                index_entries = self._scan_session_end_times()
+                end_datetimes = _parse_end_times(index_entries)
+                if not dry_run:
+                    self._session_index.rebuild(index_entries)
 
+        for session_id, end_datetime in end_datetimes.items():
             # 检查是否过期
-            end_time = metadata.get('end_time')
-            if not end_time:
+            if end_datetime >= cutoff_time:
                 continue
 
-            end_datetime = datetime.fromisoformat(end_time)
-            if end_datetime < cutoff_time:
-                # 计算目录大小
-                size = sum(f.stat().st_size for f in session_dir.rglob('*') if f.is_file())
-                total_size += size
+            session_dir = self.sessions_dir / session_id
+            if not session_dir.is_dir():
+                continue
 
-                deleted_sessions.append({
-                    "session_id": metadata['session_id'],
-                    "end_time": end_time,
-                    "size_bytes": size
-                })
+            # 计算目录大小
+            size = _dir_size(session_dir)
 
-                # 删除目录
-                if not dry_run:
+            # 删除目录（单个目录删除失败不影响其余会话的清理）
+            if not dry_run:
+                try:
                     shutil.rmtree(session_dir)
-
-                deleted_count += 1
+                except OSError as e:
+                    logger.warning(f"删除会话目录失败 {session_dir}: {e}")
+                    failed_count += 1
+                    continue
+                self._session_path_cache.pop(session_id, None)
+
+            total_size += size
+            deleted_sessions.append({
+                "session_id": session_id,
+                "end_time": index_entries[session_id],
+                "size_bytes": size
+            })
+            deleted_count += 1
+
+        # 从索引中移除已删除的会话
+        if not dry_run and deleted_sessions:
+            self._session_index.remove(s["session_id"] for s in deleted_sessions)
 
         return {
             "deleted": deleted_count,
+            "failed": failed_count,
             "total_size_mb": total_size / (1024 * 1024),
             "sessions": deleted_sessions,
             "dry_run": dry_run
         }
 
+    def _scan_session_end_times(self) -> Dict[str, str]:
+        """
+        全量扫描会话元数据，收集已结束会话的结束时间（用于重建索引）
+
+        Returns:
+            session_id -> end_time 映射
+        """
+        session_dirs = _list_session_dirs(self.sessions_dir)
+
+        end_times: Dict[str, str] = {}
+        for session_dir, metadata in zip(session_dirs, _read_metadata_batch(session_dirs)):
+            if metadata is None:
+                continue
+
+            end_time = metadata.get('end_time')
+            if end_time:
+                end_times[session_dir.name] = end_time
+
+        return end_times
+
     def cleanup(self):
         """
         清理会话管理器资源
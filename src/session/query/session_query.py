@@ -8,13 +8,21 @@
 """
 
 import asyncio
-import json
+import logging
+from contextlib import aclosing
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, TYPE_CHECKING
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, TYPE_CHECKING
 
 from ...logging_config import get_logger
 from ...error_handling import AgentSystemError
+from ...json_utils import dumps_bytes, loads as json_loads
 from ..core.session_manager import SessionManager
+from ..utils.instance_utils import (
+    infer_instance_name,
+    extract_instance_from_tool_name,
+    get_instance_path
+)
 from ..utils.query_helpers import (
     calculate_session_statistics,
     search_sessions_in_list,
@@ -29,6 +37,9 @@ if TYPE_CHECKING:
 
 logger = get_logger(__name__)
 
+# 批量回调时单批最多合并的消息数
+_MESSAGE_BATCH_SIZE = 64
+
 
 class SessionQuery:
     """
@@ -55,8 +66,6 @@ class SessionQuery:
             instances_root: 实例根目录
             message_bus: 消息总线（用于订阅功能）
         """
-        from ..utils import get_instance_path
-
         self.instance_name = instance_name
         self.instances_root = instances_root
         self.instance_path = get_instance_path(instance_name, instances_root)
@@ -74,9 +83,16 @@ class SessionQuery:
 
         # 回调函数
         self.on_parent_message: Optional[Callable[[Any], None]] = None
+        self.on_parent_batch: Optional[Callable[[List[Any]], None]] = None
         self.on_child_message: Optional[Callable[[str, str, Any], None]] = None
         self.on_child_started: Optional[Callable[[str, str], None]] = None
 
+        # 回调是否为协程函数（启动订阅时解析一次，避免逐条消息判断）
+        self._parent_is_coro = False
+        self._parent_batch_is_coro = False
+        self._child_is_coro = False
+        self._child_started_is_coro = False
+
     # === 基础查询功能 ===
 
     def get_session_details(
@@ -104,10 +120,9 @@ class SessionQuery:
 
             # 读取统计信息
             statistics_file = session.session_dir / "statistics.json"
-            if statistics_file.exists():
-                with open(statistics_file, 'r', encoding='utf-8') as f:
-                    statistics = json.load(f)
-            else:
+            try:
+                statistics = json_loads(statistics_file.read_bytes())
+            except FileNotFoundError:
                 statistics = session.get_statistics()
 
             # 读取消息
@@ -176,12 +191,31 @@ class SessionQuery:
         Returns:
             消息列表
         """
+        return list(self.iter_session_messages(session_id, message_types, limit))
+
+    def iter_session_messages(
+        self,
+        session_id: str,
+        message_types: Optional[List[str]] = None,
+        limit: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        逐条迭代会话消息（流式读取，不构建中间列表）
+
+        Args:
+            session_id: 会话 ID
+            message_types: 过滤消息类型
+            limit: 限制返回数量
+
+        Yields:
+            消息字典
+        """
         try:
             session = self.session_manager.get_session(session_id)
-            return list(session.get_messages(
+            yield from session.get_messages(
                 message_types=message_types,
                 limit=limit
-            ))
+            )
         except Exception as e:
             raise AgentSystemError(f"获取会话消息失败: {e}")
 
@@ -249,6 +283,17 @@ class SessionQuery:
             include_messages: 是否包含消息
         """
         try:
+            # JSONL 逐行写出，消息直接从生成器流式读取
+            if format == "jsonl":
+                data = self.get_session_details(session_id=session_id)
+                messages = None
+                if include_messages:
+                    # 与 get_session_details 默认的 message_limit 保持一致
+                    messages = self.iter_session_messages(session_id, limit=100)
+                export_session_to_jsonl(output_file, data, include_messages, messages)
+                logger.info(f"已导出会话到: {output_file}")
+                return
+
             # 获取会话数据
             data = self.get_session_details(
                 session_id=session_id,
@@ -257,11 +302,7 @@ class SessionQuery:
 
             # 写入文件
             if format == "json":
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=2, ensure_ascii=False)
-
-            elif format == "jsonl":
-                export_session_to_jsonl(output_file, data, include_messages)
+                output_file.write_bytes(dumps_bytes(data, indent=True))
 
             elif format == "text":
                 export_session_to_text(output_file, session_id, data)
@@ -298,7 +339,8 @@ class SessionQuery:
         on_parent_message: Optional[Callable[[Any], None]] = None,
         on_child_message: Optional[Callable[[str, str, Any], None]] = None,
         on_child_started: Optional[Callable[[str, str], None]] = None,
-        auto_start: bool = True
+        auto_start: bool = True,
+        on_parent_batch: Optional[Callable[[List[Any]], None]] = None
     ) -> None:
         """
         开始订阅会话消息
@@ -309,6 +351,8 @@ class SessionQuery:
             on_child_message: 子实例消息回调
             on_child_started: 子实例启动回调
             auto_start: 是否自动启动订阅任务
+            on_parent_batch: 父实例批量消息回调（可选，设置后替代 on_parent_message，
+                每次传入已到达的一批消息，最多 64 条）
         """
         if not self.message_bus:
             raise AgentSystemError("未配置 MessageBus，无法使用订阅功能")
@@ -319,6 +363,7 @@ class SessionQuery:
 
         self.session_id = session_id
         self.on_parent_message = on_parent_message
+        self.on_parent_batch = on_parent_batch
         self.on_child_message = on_child_message
         self.on_child_started = on_child_started
 
@@ -336,6 +381,12 @@ class SessionQuery:
         self._running = True
         self._stopped = False
 
+        # 回调在订阅期间固定，预先解析分发方式
+        self._parent_is_coro = asyncio.iscoroutinefunction(self.on_parent_message)
+        self._parent_batch_is_coro = asyncio.iscoroutinefunction(self.on_parent_batch)
+        self._child_is_coro = asyncio.iscoroutinefunction(self.on_child_message)
+        self._child_started_is_coro = asyncio.iscoroutinefunction(self.on_child_started)
+
         logger.info(f"[SessionQuery] 开始订阅 session: {self.session_id}")
 
         # 启动父会话订阅任务
@@ -388,7 +439,10 @@ class SessionQuery:
         max_depth: int = 10
     ) -> Dict[str, Any]:
         """
-        递归构建会话树
+        构建会话树
+
+        按层迭代构建（不使用递归），同一层的子会话详情在线程池中并行读取。
+        单次调用内会话详情按 session_id 缓存，同一子会话被多次引用时只读取一次。
 
         Args:
             session_id: 会话 ID
@@ -399,8 +453,6 @@ class SessionQuery:
         Returns:
             会话树字典
         """
-        from ..utils import infer_instance_name, extract_instance_from_tool_name
-
         # 推断实例名称（如果未提供）
         if instance_name is None:
             instance_name = infer_instance_name(session_id, self.instances_root)
@@ -408,47 +460,91 @@ class SessionQuery:
         if instance_name is None:
             raise ValueError(f"无法推断会话 {session_id} 的实例名称，请手动指定")
 
-        # 1. 获取会话详情
-        details = self.get_session_details(
+        # 1. 获取根会话详情并构建根节点
+        details = await asyncio.to_thread(
+            self.get_session_details,
             session_id=session_id,
             include_messages=include_messages
         )
-
-        # 2. 构建当前节点
-        tree_node = build_tree_node(session_id, instance_name, details, include_messages)
-
-        # 3. 递归构建子会话树
-        if max_depth > 0 and details.get("subsessions"):
-            for subsess_info in details["subsessions"]:
-                child_session_id = subsess_info.get('session_id')
-                if not child_session_id:
+        root = build_tree_node(session_id, instance_name, details, include_messages)
+
+        # 本次调用内的会话详情缓存（session_id -> 详情或异常）
+        details_cache: Dict[str, Any] = {session_id: details}
+
+        # 2. 逐层构建子会话树：(节点, 会话详情, 剩余深度)
+        level = [(root, details, max_depth)]
+        while level:
+            # 收集本层所有待加载的子会话：(父节点, 子节点位置, 子会话 ID, 子实例名称, 剩余深度)
+            pending = []
+            for node, node_details, depth in level:
+                if depth <= 0 or not node_details.get("subsessions"):
                     continue
 
-                # 从工具名称推断子实例名称
-                tool_name = subsess_info.get('tool_name', "")
-                child_instance_name = extract_instance_from_tool_name(tool_name, self.instances_root)
+                for subsess_info in node_details["subsessions"]:
+                    child_session_id = subsess_info.get('session_id')
+                    if not child_session_id:
+                        continue
+
+                    # 从工具名称推断子实例名称
+                    tool_name = subsess_info.get('tool_name', "")
+                    child_instance_name = extract_instance_from_tool_name(tool_name, self.instances_root)
+
+                    if child_instance_name:
+                        # 先占位，保证子节点顺序与 subsessions 一致
+                        node["subsessions"].append(None)
+                        pending.append((
+                            node,
+                            len(node["subsessions"]) - 1,
+                            child_session_id,
+                            child_instance_name,
+                            depth - 1
+                        ))
+                    else:
+                        logger.warning(f"无法从工具名称 {tool_name} 推断实例名称")
+
+            if not pending:
+                break
+
+            # 并行读取本层尚未缓存的子会话详情（去重）
+            to_fetch = list(dict.fromkeys(
+                child_session_id
+                for _, _, child_session_id, _, _ in pending
+                if child_session_id not in details_cache
+            ))
+            results = await asyncio.gather(
+                *(
+                    asyncio.to_thread(
+                        self.get_session_details,
+                        session_id=child_session_id,
+                        include_messages=include_messages
+                    )
+                    for child_session_id in to_fetch
+                ),
+                return_exceptions=True
+            )
+            details_cache.update(zip(to_fetch, results))
+
+            level = []
+            for node, index, child_session_id, child_instance_name, depth in pending:
+                result = details_cache[child_session_id]
+                if isinstance(result, BaseException) and not isinstance(result, Exception):
+                    raise result
+
+                if isinstance(result, Exception):
+                    logger.warning(f"构建子会话树失败 {child_session_id}: {result}")
+                    # 添加错误节点
+                    node["subsessions"][index] = {
+                        "session_id": child_session_id,
+                        "instance_name": child_instance_name,
+                        "error": str(result)
+                    }
+                    continue
 
-                if child_instance_name:
-                    try:
-                        child_tree = await self.build_session_tree(
-                            session_id=child_session_id,
-                            instance_name=child_instance_name,
-                            include_messages=include_messages,
-                            max_depth=max_depth - 1
-                        )
-                        tree_node["subsessions"].append(child_tree)
-                    except Exception as e:
-                        logger.warning(f"构建子会话树失败 {child_session_id}: {e}")
-                        # 添加错误节点
-                        tree_node["subsessions"].append({
-                            "session_id": child_session_id,
-                            "instance_name": child_instance_name,
-                            "error": str(e)
-                        })
-                else:
-                    logger.warning(f"无法从工具名称 {tool_name} 推断实例名称")
+                child_node = build_tree_node(child_session_id, child_instance_name, result, include_messages)
+                node["subsessions"][index] = child_node
+                level.append((child_node, result, depth))
 
-        return tree_node
+        return root
 
     def flatten_tree(self, tree: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
@@ -469,32 +565,100 @@ class SessionQuery:
         channel = f"session:{self.session_id}"
         logger.info(f"[SessionQuery] 订阅父频道: {channel}")
 
+        if self.on_parent_batch:
+            await self._subscribe_parent_batched(channel)
+            return
+
+        await self._run_subscription(
+            channel,
+            self.on_parent_message,
+            self._parent_is_coro,
+            "父会话",
+            on_start=self._handle_child_started
+        )
+
+    async def _subscribe_parent_batched(self, channel: str) -> None:
+        """按批次订阅父会话消息（内部方法）"""
         try:
-            async for message in self.message_bus.subscribe(channel):
-                if self._stopped:
-                    break
+            async with aclosing(self._iter_message_batches(channel)) as batches:
+                async for batch in batches:
+                    if self._stopped:
+                        break
+
+                    # 子实例启动通知单独处理，其前后的普通消息保持原有顺序分批回调
+                    pending: List[Any] = []
+                    for message in batch:
+                        if isinstance(message, dict) and message.get("type") == "sub_instance_started":
+                            if pending:
+                                await self._dispatch_parent_batch(pending)
+                                pending = []
+                            logger.info(f"[SessionQuery] 检测到子实例启动通知: {message}")
+                            await self._handle_child_started(message)
+                        else:
+                            pending.append(message)
 
-                # 检查是否是子实例启动通知
-                if isinstance(message, dict) and message.get("type") == "sub_instance_started":
-                    logger.info(f"[SessionQuery] 检测到子实例启动通知: {message}")
-                    await self._handle_child_started(message)
-                else:
-                    # 普通消息，调用父实例消息回调
-                    logger.debug(f"[SessionQuery] 收到父会话消息: {type(message)} - {str(message)[:100]}")
-                    if self.on_parent_message:
-                        try:
-                            if asyncio.iscoroutinefunction(self.on_parent_message):
-                                await self.on_parent_message(message)
-                            else:
-                                self.on_parent_message(message)
-                        except Exception as e:
-                            logger.error(f"[SessionQuery] 父消息回调错误: {e}", exc_info=True)
+                    if pending:
+                        await self._dispatch_parent_batch(pending)
 
         except asyncio.CancelledError:
             logger.info(f"[SessionQuery] 父会话订阅已取消: {self.session_id}")
         except Exception as e:
             logger.error(f"[SessionQuery] 父会话订阅错误: {e}", exc_info=True)
 
+    async def _dispatch_parent_batch(self, batch: List[Any]) -> None:
+        """调用父实例批量消息回调（内部方法）"""
+        logger.debug("[SessionQuery] 收到父会话消息批次: %d 条", len(batch))
+        try:
+            if self._parent_batch_is_coro:
+                await self.on_parent_batch(batch)
+            else:
+                self.on_parent_batch(batch)
+        except Exception as e:
+            logger.error(f"[SessionQuery] 父消息批量回调错误: {e}", exc_info=True)
+
+    async def _iter_message_batches(self, channel: str) -> AsyncIterator[List[Any]]:
+        """
+        按批次迭代频道消息（内部方法）
+
+        后台任务持续读取订阅并放入队列；每批等待首条消息后，
+        再合并队列中已就绪的消息，单批最多 _MESSAGE_BATCH_SIZE 条。
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        end = object()
+
+        async def pump() -> None:
+            try:
+                async for message in self.message_bus.subscribe(channel):
+                    queue.put_nowait(message)
+            finally:
+                queue.put_nowait(end)
+
+        pump_task = asyncio.create_task(pump())
+        try:
+            while True:
+                message = await queue.get()
+                if message is end:
+                    return
+
+                batch = [message]
+                finished = False
+                while len(batch) < _MESSAGE_BATCH_SIZE:
+                    try:
+                        message = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    if message is end:
+                        finished = True
+                        break
+                    batch.append(message)
+
+                yield batch
+                if finished:
+                    return
+        finally:
+            pump_task.cancel()
+            await asyncio.gather(pump_task, return_exceptions=True)
+
     async def _handle_child_started(self, notification: Dict[str, Any]) -> None:
         """处理子实例启动通知（内部方法）"""
         child_session_id = notification.get("child_session_id")
@@ -514,7 +678,7 @@ class SessionQuery:
         # 调用子实例启动回调
         if self.on_child_started:
             try:
-                if asyncio.iscoroutinefunction(self.on_child_started):
+                if self._child_started_is_coro:
                     await self.on_child_started(child_session_id, child_instance_name)
                 else:
                     self.on_child_started(child_session_id, child_instance_name)
@@ -533,34 +697,63 @@ class SessionQuery:
         channel = f"session:{child_session_id}"
         logger.info(f"[SessionQuery] 订阅子频道: {channel} ({instance_name})")
 
+        callback = None
+        if self.on_child_message:
+            callback = partial(self.on_child_message, child_session_id, instance_name)
+
+        await self._run_subscription(
+            channel,
+            callback,
+            self._child_is_coro,
+            f"子会话 ({instance_name})"
+        )
+
+    async def _run_subscription(
+        self,
+        channel: str,
+        callback: Optional[Callable[[Any], Any]],
+        is_coro: bool,
+        label: str,
+        on_start: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ) -> None:
+        """
+        运行单个频道的订阅循环（内部方法）
+
+        Args:
+            channel: 频道名称
+            callback: 消息回调（接收单个消息参数）
+            is_coro: 回调是否为协程函数
+            label: 日志中使用的订阅描述
+            on_start: 子实例启动通知处理函数（仅父会话订阅需要）
+        """
         try:
             async for message in self.message_bus.subscribe(channel):
                 if self._stopped:
                     break
 
-                # 记录收到的子会话消息
-                logger.debug(f"[SessionQuery] 收到子会话消息 ({instance_name}): {type(message)} - {str(message)[:100]}")
+                # 检查是否是子实例启动通知
+                if on_start and isinstance(message, dict) and message.get("type") == "sub_instance_started":
+                    logger.info(f"[SessionQuery] 检测到子实例启动通知: {message}")
+                    await on_start(message)
+                    continue
 
-                # 调用子实例消息回调
-                if self.on_child_message:
+                if logger.isEnabledFor(logging.DEBUG):
+                    # str(message) 需要格式化整条消息，仅在启用 DEBUG 时构造
+                    logger.debug("[SessionQuery] 收到%s消息: %s - %s", label, type(message), str(message)[:100])
+
+                if callback:
                     try:
-                        if asyncio.iscoroutinefunction(self.on_child_message):
-                            await self.on_child_message(child_session_id, instance_name, message)
+                        if is_coro:
+                            await callback(message)
                         else:
-                            self.on_child_message(child_session_id, instance_name, message)
+                            callback(message)
                     except Exception as e:
-                        logger.error(
-                            f"[SessionQuery] 子消息回调错误 ({instance_name}): {e}",
-                            exc_info=True
-                        )
+                        logger.error(f"[SessionQuery] {label}消息回调错误: {e}", exc_info=True)
 
         except asyncio.CancelledError:
-            logger.info(f"[SessionQuery] 子会话订阅已取消: {child_session_id} ({instance_name})")
+            logger.info(f"[SessionQuery] {label}订阅已取消: {channel}")
         except Exception as e:
-            logger.error(
-                f"[SessionQuery] 子会话订阅错误 ({instance_name}): {e}",
-                exc_info=True
-            )
+            logger.error(f"[SessionQuery] {label}订阅错误: {e}", exc_info=True)
 
     def __repr__(self) -> str:
         return (
@@ -572,6 +765,17 @@ class SessionQuery:
 
 # === 向后兼容的函数别名 ===
 
+@lru_cache(maxsize=64)
+def _get_cached_query(instance_name: str, instances_root: Optional[str]) -> SessionQuery:
+    """按 (实例名, 实例根目录) 缓存 SessionQuery 实例"""
+    return SessionQuery(instance_name, Path(instances_root) if instances_root else None)
+
+
+def _get_query(instance_name: str, instances_root: Optional[Path] = None) -> SessionQuery:
+    """获取缓存的 SessionQuery 实例（供函数别名复用）"""
+    return _get_cached_query(instance_name, str(instances_root) if instances_root else None)
+
+
 def get_session_details(*args, **kwargs) -> Dict[str, Any]:
     """向后兼容的函数别名"""
     # 从参数中提取 instance_name 和 session_id
@@ -582,28 +786,28 @@ def get_session_details(*args, **kwargs) -> Dict[str, Any]:
         instance_name = kwargs.get('instance_name')
         session_id = kwargs.get('session_id')
 
-    query = SessionQuery(instance_name, kwargs.get('instances_root'))
+    query = _get_query(instance_name, kwargs.get('instances_root'))
     return query.get_session_details(session_id, kwargs.get('include_messages', False), kwargs.get('message_limit', 100))
 
 
 def list_sessions(*args, **kwargs) -> List[Dict[str, Any]]:
     """向后兼容的函数别名"""
     instance_name = args[0] if args else kwargs.get('instance_name')
-    query = SessionQuery(instance_name, kwargs.get('instances_root'))
+    query = _get_query(instance_name, kwargs.get('instances_root'))
     return query.list_sessions(kwargs.get('status'), kwargs.get('limit', 100), kwargs.get('offset', 0))
 
 
 def search_sessions(*args, **kwargs) -> List[Dict[str, Any]]:
     """向后兼容的函数别名"""
     instance_name = args[0] if args else kwargs.get('instance_name')
-    query = SessionQuery(instance_name, kwargs.get('instances_root'))
+    query = _get_query(instance_name, kwargs.get('instances_root'))
     return query.search_sessions(args[1] if len(args) > 1 else kwargs.get('query'), kwargs.get('field', 'initial_prompt'), kwargs.get('limit', 10))
 
 
 def get_session_statistics_summary(*args, **kwargs) -> Dict[str, Any]:
     """向后兼容的函数别名"""
     instance_name = args[0] if args else kwargs.get('instance_name')
-    query = SessionQuery(instance_name, kwargs.get('instances_root'))
+    query = _get_query(instance_name, kwargs.get('instances_root'))
     return query.get_statistics_summary(kwargs.get('recent_days'))
 
 
@@ -613,7 +817,7 @@ def export_session(*args, **kwargs) -> None:
     session_id = args[1] if len(args) > 1 else kwargs.get('session_id')
     output_file = args[2] if len(args) > 2 else kwargs.get('output_file')
 
-    query = SessionQuery(instance_name, kwargs.get('instances_root'))
+    query = _get_query(instance_name, kwargs.get('instances_root'))
     return query.export_session(
         session_id,
         output_file,
@@ -625,7 +829,7 @@ def export_session(*args, **kwargs) -> None:
 def cleanup_sessions(*args, **kwargs) -> Dict[str, Any]:
     """向后兼容的函数别名"""
     instance_name = args[0] if args else kwargs.get('instance_name')
-    query = SessionQuery(instance_name, kwargs.get('instances_root'))
+    query = _get_query(instance_name, kwargs.get('instances_root'))
     return query.cleanup_sessions(kwargs.get('retention_days', 30), kwargs.get('dry_run', False))
 
 
@@ -634,7 +838,7 @@ def get_session_messages(*args, **kwargs) -> List[Dict[str, Any]]:
     instance_name = args[0] if args else kwargs.get('instance_name')
     session_id = args[1] if len(args) > 1 else kwargs.get('session_id')
 
-    query = SessionQuery(instance_name, kwargs.get('instances_root'))
+    query = _get_query(instance_name, kwargs.get('instances_root'))
     return query.get_session_messages(session_id, kwargs.get('message_types'), kwargs.get('limit'))
 
 
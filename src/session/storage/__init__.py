@@ -1,5 +1,6 @@
 """会话存储模块"""
 
 from .jsonl_writer import JSONLWriter
+from .session_index import SessionIndex
 
-__all__ = ["JSONLWriter"]
+__all__ = ["JSONLWriter", "SessionIndex"]
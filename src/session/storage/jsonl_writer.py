@@ -1,125 +1,280 @@
 """异步批量 JSONL 写入器"""
 
 import asyncio
-import json
 import logging
+import os
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Union
+
+from ...json_utils import dumps_bytes
 
 logger = logging.getLogger(__name__)
 
+# 单次 writev 调用允许的最大缓冲区数量（POSIX 保证至少 16，Linux 为 1024）
+_IOV_MAX = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") and "SC_IOV_MAX" in os.sysconf_names else 1024
+
+
+def _write_lines(fh, lines: list[bytes]) -> None:
+    """
+    将多行一次性写入已打开的文件
+
+    支持 os.writev 的平台上使用向量化写入，每批只需一次系统调用；
+    其他平台回退为一次性写入拼接后的数据。
+
+    Args:
+        fh: 以无缓冲追加模式打开的文件对象
+        lines: 已编码的行（包含换行符）
+    """
+    if not hasattr(os, "writev"):
+        fh.write(b"".join(lines))
+        return
+
+    fd = fh.fileno()
+    for start in range(0, len(lines), _IOV_MAX):
+        chunk = lines[start:start + _IOV_MAX]
+        total = sum(len(line) for line in chunk)
+        written = os.writev(fd, chunk)
+        if written < total:
+            # 部分写入：剩余数据逐次补写
+            data = memoryview(b"".join(chunk))[written:]
+            while data:
+                data = data[os.write(fd, data):]
+
+
+# 默认批量参数（需要更低延迟时可通过构造参数或环境变量覆盖）
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_FLUSH_INTERVAL = 2.0
+DEFAULT_MAX_BUFFER_BYTES = 4 * 1024 * 1024
+DEFAULT_MAX_PENDING_BYTES = 16 * 1024 * 1024
+
 
 class JSONLWriter:
     """
     异步批量 JSONL 写入器
 
     特性：
-    - 批量写入缓冲区（默认 10 条消息）
-    - 定时刷新（默认 1 秒）
+    - 批量写入缓冲区（默认 256 条消息）
+    - 缓冲区字节上限（默认 4 MiB，超过立即刷新）
+    - 待写入数据上限（默认 16 MiB，超过时 write() 等待落盘，形成背压）
+    - 定时刷新（默认 2 秒）
     - 后台任务自动刷新
     - 紧急备份机制（写入失败时备份到 .backup.jsonl）
     - finalize() 时强制刷新并停止
+
+    messages.jsonl 的文件句柄在首次写入时打开并保持到 finalize()。
+    每批数据写入后即进入内核页缓存（进程崩溃不丢失），
+    但只在 finalize() 时 fsync 一次：以吞吐量换取掉电场景下的持久性。
     """
 
     def __init__(
         self,
         session_dir: Path,
-        batch_size: int = 10,
-        flush_interval: float = 1.0
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        max_buffer_bytes: int = DEFAULT_MAX_BUFFER_BYTES,
+        max_pending_bytes: int = DEFAULT_MAX_PENDING_BYTES
     ):
         """
         初始化 JSONLWriter
 
+        需要更低写入延迟时，可调小 batch_size / flush_interval。
+
         Args:
             session_dir: 会话目录
             batch_size: 批量写入大小（达到此数量立即刷新）
             flush_interval: 定时刷新间隔（秒）
+            max_buffer_bytes: 缓冲区字节上限（高水位，达到此大小立即刷新）
+            max_pending_bytes: 待写入数据上限（缓冲区 + 正在写入的批次），
+                达到后 write() 挂起直到数据落盘，防止磁盘阻塞时内存无限增长
         """
         self.session_dir = Path(session_dir)
         self.batch_size = batch_size
         self.flush_interval = flush_interval
+        self.max_buffer_bytes = max_buffer_bytes
+        self.max_pending_bytes = max_pending_bytes
 
         self.messages_file = self.session_dir / "messages.jsonl"
         self.backup_file = self.session_dir / "messages.backup.jsonl"
 
-        self._buffer: list[dict] = []
+        # 缓冲区保存已编码的行（包含换行符）
+        self._buffer: list[bytes] = []
+        self._buffer_bytes = 0
+        # 尚未落盘的字节数（缓冲区 + 等待/正在写入的批次），用于背压
+        self._pending_bytes = 0
+        self._space_available = asyncio.Event()
+        self._space_available.set()
+        # _lock 保护缓冲区；_write_lock 保证各批次按顺序落盘
         self._lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._stop_event = asyncio.Event()
+        # 持久文件句柄（首次写入时打开，finalize 时关闭）
+        self._fh = None
         self._flush_task: Optional[asyncio.Task] = None
         self._stopped = False
 
         # 启动后台刷新任务
         self._flush_task = asyncio.create_task(self._auto_flush())
 
-    async def write(self, message_data: dict):
+    async def write(self, message_data: Union[dict, bytes]):
         """
         写入一条消息到缓冲区
 
         Args:
-            message_data: 消息数据
+            message_data: 消息数据（字典，或已编码的单条 JSON 记录 bytes，不含换行符）
         """
         if self._stopped:
             logger.warning("JSONLWriter 已停止，无法写入消息")
             return
 
+        if isinstance(message_data, bytes):
+            line = message_data + b"\n"
+        else:
+            try:
+                line = dumps_bytes(message_data) + b"\n"
+            except (TypeError, ValueError) as e:
+                logger.error(f"序列化消息失败: {e}，跳过该消息")
+                return
+
+        # 背压：待写入数据超过上限时，等待已有批次落盘腾出空间
+        while self._pending_bytes >= self.max_pending_bytes and not self._stopped:
+            self._space_available.clear()
+            await self._space_available.wait()
+
+        if self._stopped:
+            logger.warning("JSONLWriter 已停止，无法写入消息")
+            return
+
+        batch = None
         async with self._lock:
-            self._buffer.append(message_data)
+            self._buffer.append(line)
+            self._buffer_bytes += len(line)
+            self._pending_bytes += len(line)
 
-            # 达到批量大小，立即刷新
-            if len(self._buffer) >= self.batch_size:
-                await self._flush()
+            # 达到批量大小或字节上限，立即刷新
+            if len(self._buffer) >= self.batch_size or self._buffer_bytes >= self.max_buffer_bytes:
+                batch = self._take_buffer()
+
+        if batch:
+            await self._write_batch(batch)
 
     async def _auto_flush(self):
         """后台定时刷新任务"""
         try:
             while not self._stopped:
-                await asyncio.sleep(self.flush_interval)
+                try:
+                    await asyncio.wait_for(self._stop_event.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+                if self._stopped:
+                    break
 
-                async with self._lock:
-                    if self._buffer:
-                        await self._flush()
+                await self._flush()
         except asyncio.CancelledError:
             logger.debug("JSONLWriter 后台刷新任务已取消")
         except Exception as e:
             logger.error(f"JSONLWriter 后台刷新任务异常: {e}")
 
+    def _take_buffer(self) -> list[bytes]:
+        """
+        取出当前缓冲区内容
+
+        注意：调用者需要持有 _lock
+        """
+        batch = self._buffer
+        self._buffer = []
+        self._buffer_bytes = 0
+        return batch
+
     async def _flush(self):
+        """刷新缓冲区到文件"""
+        async with self._lock:
+            batch = self._take_buffer()
+
+        if batch:
+            await self._write_batch(batch)
+
+    async def _write_batch(self, batch: list[bytes]):
         """
-        刷新缓冲区到文件
+        将一批数据写入文件（磁盘 I/O 在线程中执行，不阻塞事件循环）
 
-        注意：此方法不加锁，调用者需要持有锁
+        Args:
+            batch: 已编码的行
         """
-        if not self._buffer:
-            return
+        async with self._write_lock:
+            try:
+                await asyncio.to_thread(self._write_sync, batch)
+                logger.debug(f"刷新 {len(batch)} 条消息到 {self.messages_file}")
+            except Exception as e:
+                logger.error(f"写入 JSONL 失败: {e}，尝试紧急备份")
+                if not await self._emergency_backup(batch):
+                    # 批次已放回缓冲区，仍计入待写入数据
+                    return
 
-        try:
+        self._release_pending(sum(len(line) for line in batch))
+
+    def _release_pending(self, nbytes: int):
+        """批次落盘后释放待写入额度，唤醒等待中的写入者"""
+        self._pending_bytes -= nbytes
+        if self._pending_bytes < self.max_pending_bytes:
+            self._space_available.set()
+
+    def _ensure_open(self):
+        """打开 messages.jsonl 的持久句柄（追加模式，支持 resume）"""
+        if self._fh is None:
             # 确保目录存在
             self.session_dir.mkdir(parents=True, exist_ok=True)
+            # 无缓冲：批次数据已在内存中聚合，每批由 os.writev 一次写入内核；
+            # 若再套一层 BufferedWriter，writev 会绕过其缓冲区，fh.write 则多一次拷贝
+            self._fh = open(self.messages_file, "ab", buffering=0)
+        return self._fh
 
-            # 追加写入（支持 resume）
-            with open(self.messages_file, "a", encoding="utf-8") as f:
-                for message_data in self._buffer:
-                    json_line = json.dumps(message_data, ensure_ascii=False)
-                    f.write(json_line + "\n")
+    def _close_sync(self, sync: bool = False):
+        """关闭持久句柄（在工作线程中执行）"""
+        if self._fh is None:
+            return
+        try:
+            if sync:
+                os.fsync(self._fh.fileno())
+        finally:
+            self._fh.close()
+            self._fh = None
 
-            logger.debug(f"刷新 {len(self._buffer)} 条消息到 {self.messages_file}")
-            self._buffer.clear()
+    def _write_sync(self, batch: list[bytes]):
+        """同步写入一批数据（在工作线程中执行）"""
+        try:
+            # 追加写入，整批一次系统调用
+            _write_lines(self._ensure_open(), batch)
+        except Exception:
+            # 出错后丢弃句柄，下次写入重新打开
+            try:
+                self._close_sync()
+            except Exception:
+                pass
+            raise
 
-        except Exception as e:
-            logger.error(f"写入 JSONL 失败: {e}，尝试紧急备份")
-            await self._emergency_backup()
+    async def _emergency_backup(self, batch: list[bytes]) -> bool:
+        """
+        紧急备份（写入失败时）
 
-    async def _emergency_backup(self):
-        """紧急备份（写入失败时）"""
+        Returns:
+            是否备份成功（失败时批次放回缓冲区等待重试）
+        """
         try:
-            with open(self.backup_file, "a", encoding="utf-8") as f:
-                for message_data in self._buffer:
-                    json_line = json.dumps(message_data, ensure_ascii=False)
-                    f.write(json_line + "\n")
-
-            logger.warning(f"紧急备份 {len(self._buffer)} 条消息到 {self.backup_file}")
-            self._buffer.clear()
+            await asyncio.to_thread(self._backup_sync, batch)
+            logger.warning(f"紧急备份 {len(batch)} 条消息到 {self.backup_file}")
+            return True
         except Exception as e:
-            logger.error(f"紧急备份失败: {e}，消息可能丢失")
+            logger.error(f"紧急备份失败: {e}，消息放回缓冲区等待重试")
+            async with self._lock:
+                self._buffer[:0] = batch
+                self._buffer_bytes += sum(len(line) for line in batch)
+            return False
+
+    def _backup_sync(self, batch: list[bytes]):
+        """同步写入紧急备份文件（在工作线程中执行）"""
+        with open(self.backup_file, "ab") as f:
+            f.write(b"".join(batch))
 
     async def finalize(self):
         """
@@ -131,18 +286,25 @@ class JSONLWriter:
             return
 
         self._stopped = True
+        # 唤醒因背压等待的写入者
+        self._space_available.set()
 
-        # 取消后台任务
+        # 通知后台任务退出（不在写入过程中取消，保证批次顺序）
+        self._stop_event.set()
         if self._flush_task:
-            self._flush_task.cancel()
             try:
                 await self._flush_task
             except asyncio.CancelledError:
                 pass
 
         # 强制刷新剩余消息
-        async with self._lock:
-            if self._buffer:
-                await self._flush()
+        await self._flush()
+
+        # 落盘并关闭文件句柄
+        async with self._write_lock:
+            try:
+                await asyncio.to_thread(self._close_sync, True)
+            except Exception as e:
+                logger.warning(f"关闭 JSONL 文件失败: {e}")
 
         logger.info(f"JSONLWriter 已停止，所有消息已写入 {self.messages_file}")
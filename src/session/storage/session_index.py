@@ -0,0 +1,190 @@
+"""会话结束时间索引"""
+
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from ...json_utils import dumps_bytes, loads as json_loads
+
+logger = logging.getLogger(__name__)
+
+# 索引记录的时间值：end_time 为 ISO 格式字符串，created_at_ns 为纳秒时间戳整数
+IndexValue = Union[str, int]
+
+
+class SessionIndex:
+    """
+    会话结束时间索引（追加写入的 JSONL 旁路文件）
+
+    每行记录一个已完成会话：{"session_id": ..., "end_time": ...}。
+    同一 session_id 出现多次时（resume 后再次完成）以最后一行为准。
+    时间字段名可通过 value_key 指定（如工作空间索引使用 created_at_ns，值为纳秒时间戳整数）。
+
+    特性：
+    - 仅在索引文件已存在时追加，索引由 rebuild() 通过全量扫描首次创建，
+      保证索引覆盖所有历史会话
+    - 清理时只需读取索引，无需解析每个会话的 metadata.json
+    - 追加、重建、移除均持有旁路锁文件（{index_file}.lock）上的 flock 排他锁，
+      多进程并发时不会丢失记录；需要在“读取 - 全量扫描 - 重建”期间阻止追加时，
+      调用方使用 locked() 包住整个过程（不支持 fcntl 的平台上不加锁）
+    """
+
+    def __init__(self, index_file: Path, value_key: str = "end_time"):
+        """
+        初始化会话索引
+
+        Args:
+            index_file: 索引文件路径
+            value_key: 每行记录中时间字段的键名
+        """
+        self.index_file = Path(index_file)
+        self.value_key = value_key
+        self._lock_file = self.index_file.with_name(self.index_file.name + ".lock")
+        # 最近一次 load() 跳过的无效行数
+        self.skipped_lines = 0
+        # 当前线程持有锁的嵌套深度（locked() 可重入）
+        self._lock_state = threading.local()
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """
+        持有索引的排他锁（同一线程内可重入）
+        """
+        depth = getattr(self._lock_state, "depth", 0)
+        if fcntl is None or depth:
+            self._lock_state.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._lock_state.depth = depth
+            return
+
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self._lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            self._lock_state.depth = 1
+            try:
+                yield
+            finally:
+                self._lock_state.depth = 0
+        finally:
+            # 关闭文件描述符即释放 flock
+            os.close(fd)
+
+    def append(self, session_id: str, value: IndexValue) -> None:
+        """
+        追加一条会话完成记录（索引文件不存在时跳过）
+
+        Args:
+            session_id: 会话 ID
+            value: 时间值（写入 value_key 字段）
+        """
+        line = dumps_bytes({"session_id": session_id, self.value_key: value}) + b"\n"
+        with self.locked():
+            try:
+                fd = os.open(self.index_file, os.O_WRONLY | os.O_APPEND)
+            except FileNotFoundError:
+                return
+
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def load(self) -> Optional[Dict[str, IndexValue]]:
+        """
+        读取索引（跳过的无效行数记录在 skipped_lines，调用方可据此决定是否重建）
+
+        Returns:
+            session_id -> 时间值映射，索引文件不存在时返回 None
+        """
+        try:
+            data = self.index_file.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        entries: Dict[str, IndexValue] = {}
+        self.skipped_lines = 0
+        for line in data.splitlines():
+            if not line:
+                continue
+            try:
+                entry = json_loads(line)
+                entries[entry["session_id"]] = entry[self.value_key]
+            except Exception as e:
+                self.skipped_lines += 1
+                logger.warning(f"跳过无效索引行: {e}")
+
+        return entries
+
+    def rebuild(self, entries: Dict[str, IndexValue]) -> None:
+        """
+        用给定记录重建索引文件
+
+        Args:
+            entries: session_id -> 时间值映射
+        """
+        with self.locked():
+            self._replace(self._serialize(entries))
+        logger.info(f"重建会话索引: {len(entries)} 条记录 -> {self.index_file}")
+
+    def remove(self, removed_ids: Iterable[str]) -> None:
+        """
+        从索引中移除已删除的会话（压缩索引文件）
+
+        持锁重新读取当前索引后再过滤，load() 之后其他进程追加的记录会保留。
+
+        Args:
+            removed_ids: 需要移除的 session_id
+        """
+        removed = set(removed_ids)
+        if not removed:
+            return
+
+        with self.locked():
+            entries = self.load()
+            if entries is None:
+                return
+
+            self._replace(self._serialize({
+                session_id: value
+                for session_id, value in entries.items()
+                if session_id not in removed
+            }))
+
+    def _serialize(self, entries: Dict[str, IndexValue]) -> bytes:
+        """序列化索引记录为 JSONL bytes"""
+        return b"".join(
+            dumps_bytes({"session_id": session_id, self.value_key: value}) + b"\n"
+            for session_id, value in entries.items()
+        )
+
+    def _replace(self, data: bytes) -> None:
+        """原子替换索引文件内容（临时文件名唯一，并发调用互不覆盖）"""
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=self.index_file.name + ".", suffix=".tmp", dir=self.index_file.parent
+        )
+        try:
+            # mkstemp 创建的文件权限为 0600，恢复为普通文件权限
+            if hasattr(os, "fchmod"):
+                os.fchmod(fd, 0o644)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.index_file)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
@@ -1,16 +1,99 @@
 """Redis 消息总线 - 实时消息推送"""
 
 import asyncio
-import json
 import logging
 import os
+import threading
+import weakref
 from pathlib import Path
-from typing import AsyncIterator, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
 
 import yaml
 
+from ...json_utils import dumps_bytes, loads as json_loads, JSONDecodeError
+
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 logger = logging.getLogger(__name__)
 
+# 发布队列容量（Redis 阻塞时超出部分直接丢弃，Pub/Sub 本身不保证送达）
+_OUTBOX_MAXSIZE = 10000
+# 单个 pipeline 最多合并的 PUBLISH 数量
+_PUBLISH_BATCH_SIZE = 256
+# close() 时等待发布队列清空的最长时间（秒）
+_CLOSE_DRAIN_TIMEOUT = 5.0
+# subscribe() 单次从 PubSub 连接缓冲区取出的最大消息数
+_SUBSCRIBE_BATCH_SIZE = 256
+
+# from_config() 创建的共享实例：事件循环 -> {(redis_url, redis_db) -> MessageBus}
+# 按事件循环区分（发布队列与后台任务绑定在创建它们的事件循环上），事件循环销毁后自动移除
+_SHARED_BUSES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, int], MessageBus]]" = (
+    weakref.WeakKeyDictionary()
+)
+_SHARED_BUSES_LOCK = threading.Lock()
+
+# streaming.yaml 解析结果缓存：路径 -> (mtime_ns, 配置字典)
+_CONFIG_CACHE: Dict[str, Tuple[int, dict]] = {}
+
+
+def _load_config_file(config_path: Path) -> Optional[dict]:
+    """
+    读取并缓存 YAML 配置文件
+
+    文件未修改（mtime 不变）时直接返回缓存结果，避免重复解析。
+    优先使用 libyaml 的 C 实现加载器。
+
+    Args:
+        config_path: 配置文件路径
+
+    Returns:
+        配置字典（只读使用），文件不存在时返回 None
+    """
+    try:
+        mtime_ns = config_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    key = str(config_path)
+    cached = _CONFIG_CACHE.get(key)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = yaml.load(f, Loader=_YamlLoader) or {}
+
+    _CONFIG_CACHE[key] = (mtime_ns, config)
+    return config
+
+
+def _decode_messages(raw_messages: List[bytes]) -> List[dict]:
+    """
+    批量解析订阅消息
+
+    正常情况下整批一次解析完成；出现无效消息时再逐条解析并跳过失败项。
+
+    Args:
+        raw_messages: 原始消息体列表
+
+    Returns:
+        解析成功的消息字典列表
+    """
+    try:
+        return [json_loads(raw) for raw in raw_messages]
+    except JSONDecodeError:
+        pass
+
+    decoded = []
+    for raw in raw_messages:
+        try:
+            decoded.append(json_loads(raw))
+        except JSONDecodeError as e:
+            logger.warning(f"解析消息失败: {e}")
+    return decoded
+
 
 class MessageBus:
     """
@@ -21,6 +104,7 @@ class MessageBus:
     - 支持多频道发布和订阅
     - 降级策略：Redis 不可用时静默失败
     - 连接池管理，支持并发
+    - 批量发布：publish() 只入队，后台任务用 pipeline 合并发送
     """
 
     def __init__(
@@ -44,7 +128,16 @@ class MessageBus:
         self._redis_client = None
         self._pubsub = None
         self._connected = False
-        self._lock = asyncio.Lock()
+        # 构造时不创建任何 asyncio 对象，均在 connect() 内于当前运行的事件循环上创建
+        # （兼容 uvloop、fork 后重建事件循环等场景）
+        # 进行中的连接任务（connect() 的并发调用者共享）
+        self._connect_task: Optional[asyncio.Future] = None
+        # 发布队列与后台 pipeline 发送任务（连接成功后创建）
+        self._outbox: Optional[asyncio.Queue] = None
+        self._flusher_task: Optional[asyncio.Task] = None
+        # 共享实例的引用计数与所属事件循环（仅 from_config() 创建的实例使用）
+        self._refcount = 0
+        self._shared_loop: Optional[weakref.ReferenceType] = None
 
     @classmethod
     def from_config(cls, config_path: Optional[str] = None) -> "MessageBus":
@@ -53,6 +146,10 @@ class MessageBus:
 
         配置优先级：环境变量 > streaming.yaml > 默认值
 
+        在事件循环内调用时，同一事件循环中相同 (redis_url, redis_db) 返回同一个共享实例
+        （共用连接池），每次调用增加一次引用计数；每个调用者用完后各自调用一次 close()，
+        最后一个引用释放时才真正关闭连接。不在事件循环内调用时返回独立实例。
+
         Args:
             config_path: 配置文件路径（可选）
 
@@ -71,30 +168,47 @@ class MessageBus:
         else:
             config_path = Path(config_path)
 
-        if config_path.exists():
-            try:
-                with open(config_path, "r", encoding="utf-8") as f:
-                    config = yaml.safe_load(f)
-
+        try:
+            config = _load_config_file(config_path)
+            if config is not None:
                 redis_config = config.get("redis", {})
                 redis_url = redis_config.get("url", redis_url)
                 redis_db = redis_config.get("db", redis_db)
                 max_connections = redis_config.get("max_connections", max_connections)
 
                 logger.info(f"从 {config_path} 加载 MessageBus 配置")
-            except Exception as e:
-                logger.warning(f"加载配置文件失败: {e}，使用默认配置")
+        except Exception as e:
+            logger.warning(f"加载配置文件失败: {e}，使用默认配置")
 
         # 环境变量覆盖
         redis_url = os.getenv("REDIS_URL", redis_url)
         redis_db = int(os.getenv("REDIS_DB", str(redis_db)))
         max_connections = int(os.getenv("REDIS_MAX_CONNECTIONS", str(max_connections)))
 
-        return cls(
-            redis_url=redis_url,
-            redis_db=redis_db,
-            max_connections=max_connections
-        )
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is None:
+            return cls(redis_url=redis_url, redis_db=redis_db, max_connections=max_connections)
+
+        key = (redis_url, redis_db)
+        with _SHARED_BUSES_LOCK:
+            buses = _SHARED_BUSES.get(loop)
+            if buses is None:
+                buses = _SHARED_BUSES[loop] = {}
+
+            bus = buses.get(key)
+            if bus is None:
+                bus = buses[key] = cls(
+                    redis_url=redis_url,
+                    redis_db=redis_db,
+                    max_connections=max_connections
+                )
+                bus._shared_loop = weakref.ref(loop)
+            bus._refcount += 1
+        return bus
 
     async def connect(self) -> bool:
         """
@@ -106,64 +220,140 @@ class MessageBus:
         if self._connected:
             return True
 
-        async with self._lock:
-            if self._connected:
-                return True
-
-            try:
-                # 导入 redis.asyncio
-                import redis.asyncio as aioredis
-
-                # 创建连接池
-                pool = aioredis.ConnectionPool.from_url(
-                    self.redis_url,
-                    db=self.redis_db,
-                    max_connections=self.max_connections,
-                    decode_responses=True
-                )
+        # 同一时刻只发起一次连接：并发调用者共享同一个连接任务，无需加锁
+        task = self._connect_task
+        if task is None:
+            task = self._connect_task = asyncio.get_running_loop().create_task(self._connect())
 
-                # 创建 Redis 客户端
-                self._redis_client = aioredis.Redis(connection_pool=pool)
+        return await asyncio.shield(task)
 
-                # 测试连接
-                await self._redis_client.ping()
-
-                self._connected = True
-                logger.info(f"MessageBus 已连接到 Redis: {self.redis_url}")
-                return True
+    async def _connect(self) -> bool:
+        """建立 Redis 连接（由 connect() 调度，同一时刻最多运行一个）"""
+        try:
+            # 导入 redis.asyncio
+            import redis.asyncio as aioredis
+
+            # 创建连接池
+            pool = aioredis.ConnectionPool.from_url(
+                self.redis_url,
+                db=self.redis_db,
+                max_connections=self.max_connections,
+                # 订阅端直接解析原始 bytes，无需先解码为 str
+                decode_responses=False
+            )
+
+            # 创建 Redis 客户端
+            self._redis_client = aioredis.Redis(connection_pool=pool)
+
+            # 测试连接
+            await self._redis_client.ping()
+
+            # 启动后台发布任务
+            self._outbox = asyncio.Queue(maxsize=_OUTBOX_MAXSIZE)
+            self._flusher_task = asyncio.create_task(self._flush_loop())
+
+            self._connected = True
+            logger.info(f"MessageBus 已连接到 Redis: {self.redis_url}")
+            return True
 
-            except ImportError:
-                logger.warning("redis 库未安装，MessageBus 降级运行（不推送实时消息）")
-                self._connected = False
-                return False
-            except Exception as e:
-                logger.warning(f"连接 Redis 失败: {e}，MessageBus 降级运行")
-                self._connected = False
-                return False
+        except ImportError:
+            logger.warning("redis 库未安装，MessageBus 降级运行（不推送实时消息）")
+            self._connected = False
+            return False
+        except Exception as e:
+            logger.warning(f"连接 Redis 失败: {e}，MessageBus 降级运行")
+            self._connected = False
+            return False
+        finally:
+            # 连接结束后允许再次尝试（失败时下次调用重新连接）
+            self._connect_task = None
 
-    async def publish(self, channel: str, message: dict) -> bool:
+    async def publish(self, channel: str, message: Union[dict, bytes, str]) -> bool:
         """
         发布消息到指定频道
 
+        消息放入发布队列后立即返回，由后台任务批量发送。
+
         Args:
             channel: 频道名称
-            message: 消息内容（字典）
+            message: 消息内容（字典，或已编码的 JSON bytes/str，此时跳过序列化）
 
         Returns:
-            是否发布成功
+            是否已加入发布队列
         """
         if not self._connected or self._redis_client is None:
             # 降级：静默失败
             return False
 
         try:
-            message_json = json.dumps(message, ensure_ascii=False)
-            await self._redis_client.publish(channel, message_json)
+            payload = message if isinstance(message, (bytes, str)) else dumps_bytes(message)
+            self._outbox.put_nowait((channel, payload))
             return True
+        except asyncio.QueueFull:
+            logger.warning(f"发布队列已满，丢弃发往 {channel} 的消息")
+            return False
         except Exception as e:
             logger.warning(f"发布消息到 {channel} 失败: {e}")
             return False
 
+    async def publish_many(self, channels: List[str], message: Union[dict, bytes, str]) -> bool:
+        """
+        发布同一条消息到多个频道
+
+        消息只序列化一次，各频道的 PUBLISH 放入发布队列，由后台任务合并发送。
+
+        Args:
+            channels: 频道名称列表
+            message: 消息内容（字典，或已编码的 JSON bytes/str）
+
+        Returns:
+            是否已加入发布队列
+        """
+        if not self._connected or self._redis_client is None:
+            # 降级：静默失败
+            return False
+
+        try:
+            payload = message if isinstance(message, (bytes, str)) else dumps_bytes(message)
+            for channel in channels:
+                self._outbox.put_nowait((channel, payload))
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"发布队列已满，丢弃发往 {channels} 的消息")
+            return False
+        except Exception as e:
+            logger.warning(f"发布消息到 {channels} 失败: {e}")
+            return False
+
+    async def _flush_loop(self):
+        """
+        后台发布任务
+
+        等待首条消息后取出队列中已就绪的消息（最多 _PUBLISH_BATCH_SIZE 条），
+        通过单个 pipeline 一次往返发送；发送期间到达的消息自然合并到下一批。
+        """
+        outbox = self._outbox
+        while True:
+            batch = [await outbox.get()]
+            while len(batch) < _PUBLISH_BATCH_SIZE:
+                try:
+                    batch.append(outbox.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            try:
+                async with self._redis_client.pipeline(transaction=False) as pipe:
+                    for channel, payload in batch:
+                        pipe.publish(channel, payload)
+                    await pipe.execute()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"批量发布 {len(batch)} 条消息失败: {e}")
+            finally:
+                for _ in batch:
+                    outbox.task_done()
+
     async def subscribe(self, *channels: str) -> AsyncIterator[dict]:
         """
         订阅一个或多个频道
@@ -186,15 +376,22 @@ class MessageBus:
             await pubsub.subscribe(*channels)
             logger.info(f"订阅频道: {channels}")
 
-            # 监听消息
-            async for message in pubsub.listen():
-                if message["type"] == "message":
-                    try:
-                        data = json.loads(message["data"])
-                        yield data
-                    except json.JSONDecodeError as e:
-                        logger.warning(f"解析消息失败: {e}")
-                        continue
+            # 监听消息（订阅确认等控制消息由 redis-py 过滤）
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+
+                # 收到一条后，非阻塞地取走缓冲区中已到达的其余消息，整批解析
+                raw_messages = [message["data"]]
+                while len(raw_messages) < _SUBSCRIBE_BATCH_SIZE:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.0)
+                    if message is None:
+                        break
+                    raw_messages.append(message["data"])
+
+                for data in _decode_messages(raw_messages):
+                    yield data
         except Exception as e:
             logger.error(f"订阅消息失败: {e}")
         finally:
@@ -203,7 +400,38 @@ class MessageBus:
                 await pubsub.close()
 
     async def close(self):
-        """关闭 Redis 连接"""
+        """
+        关闭 Redis 连接（先发送发布队列中剩余的消息）
+
+        from_config() 返回的共享实例只释放调用者的一次引用，
+        最后一个引用释放时才从共享表中移除并真正关闭。
+        """
+        with _SHARED_BUSES_LOCK:
+            if self._shared_loop is not None:
+                if self._refcount > 1:
+                    self._refcount -= 1
+                    return
+
+                # 最后一个引用：从共享表中移除，之后 from_config() 会创建新实例
+                self._refcount = 0
+                buses = _SHARED_BUSES.get(self._shared_loop())
+                key = (self.redis_url, self.redis_db)
+                if buses is not None and buses.get(key) is self:
+                    del buses[key]
+                self._shared_loop = None
+
+        # 停止接受新消息，等待队列清空后停止后台任务
+        self._connected = False
+        if self._flusher_task is not None:
+            try:
+                await asyncio.wait_for(self._outbox.join(), timeout=_CLOSE_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"发布队列未在 {_CLOSE_DRAIN_TIMEOUT} 秒内清空，剩余消息被丢弃")
+            self._flusher_task.cancel()
+            await asyncio.gather(self._flusher_task, return_exceptions=True)
+            self._flusher_task = None
+            self._outbox = None
+
         if self._redis_client:
             try:
                 await self._redis_client.close()
@@ -13,6 +13,11 @@ from contextvars import ContextVar, Token
 from ...logging_config import get_logger
 from ..utils import SessionContext
 
+try:
+    from claude_agent_sdk import ResultMessage as _ResultMessage
+except ImportError:
+    _ResultMessage = None
+
 logger = get_logger(__name__)
 
 # 全局上下文变量：存储当前会话（仅用于 stream_manager 内部）
@@ -25,7 +30,7 @@ _current_session_context: ContextVar[Optional['Any']] = ContextVar(
 def set_current_session(session: Optional['Any']) -> Token:
     """设置当前会话上下文"""
     token = _current_session_context.set(session)
-    logger.debug(f"[StreamManager] Set session: session_id={session.session_id if session else None}")
+    logger.debug("[StreamManager] Set session: session_id=%s", session.session_id if session else None)
     return token
 
 
@@ -79,6 +84,7 @@ class QueryStreamManager:
         self._finalized = False  # 防止双重 finalize
         self._context_token: Optional[Token] = None  # 保存上下文令牌
         self._initialized = False  # 标记是否已初始化
+        self._record = None  # 会话的 record_message（初始化后缓存，无会话时为 None）
 
     async def initialize(self) -> None:
         """
@@ -99,7 +105,7 @@ class QueryStreamManager:
                 # Resume 模式：恢复已有会话
                 self.session = self.session_manager.get_session(self.resume_session_id)
                 await self.session.start()  # 启动会话（确保JSONLWriter后台任务运行）
-                logger.info(f"[StreamManager] Resume and started session: {self.resume_session_id}")
+                logger.info("[StreamManager] Resume and started session: %s", self.resume_session_id)
             else:
                 # 创建新会话（可能使用预生成的 session_id）
                 self.session = await self.session_manager.create_session(
@@ -108,7 +114,10 @@ class QueryStreamManager:
                     parent_session_id=self.parent_session_id,  # 传递父会话 ID
                     session_id=self.pregenerated_session_id  # 🌟 传递预生成的 ID（如果有）
                 )
-                logger.info(f"[StreamManager] Created new session: {self.session.session_id}, parent: {self.parent_session_id}")
+                logger.info(
+                    "[StreamManager] Created new session: %s, parent: %s",
+                    self.session.session_id, self.parent_session_id
+                )
 
             # ✅ 将 session_id 写入临时文件，供子实例自动读取
             if self.session and self.instance_path:
@@ -116,28 +125,34 @@ class QueryStreamManager:
                     session_id=self.session.session_id,
                     instance_path=str(self.instance_path)
                 )
-                logger.debug(f"[StreamManager] Set session context: {self.session.session_id}")
+                logger.debug("[StreamManager] Set session context: %s", self.session.session_id)
 
+            if self.session:
+                self._record = self.session.record_message
             self._initialized = True
 
         except Exception as e:
-            logger.error(f"[StreamManager] Failed to initialize session: {e}", exc_info=True)
+            logger.error("[StreamManager] Failed to initialize session: %s", e, exc_info=True)
             # 继续执行，但不记录会话
             self.session = None
             self._initialized = True
 
     async def __aenter__(self):
         """
-        进入上下文时设置 session
+        进入上下文时初始化并设置 session
+
+        在此完成初始化后，迭代过程中不再需要额外的初始化等待。
 
         Returns:
             self
         """
+        await self.initialize()
+
         if self.session:
             self._context_token = set_current_session(self.session)
             logger.debug(
-                f"[StreamManager] Context set: session_id={self.session.session_id}, "
-                f"token={self._context_token}"
+                "[StreamManager] Context set: session_id=%s, token=%s",
+                self.session.session_id, self._context_token
             )
         return self
 
@@ -160,16 +175,16 @@ class QueryStreamManager:
                 self.session.metadata['status'] = 'interrupted'
                 self.session.metadata['error'] = 'Stream not fully consumed'
                 logger.warning(
-                    f"[StreamManager] Session interrupted (not fully consumed): "
-                    f"session_id={self.session.session_id}"
+                    "[StreamManager] Session interrupted (not fully consumed): session_id=%s",
+                    self.session.session_id
                 )
             else:
                 # 异常结束
                 self.session.metadata['status'] = 'failed'
                 self.session.metadata['error'] = str(exc_val)
                 logger.error(
-                    f"[StreamManager] Session failed: session_id={self.session.session_id}, "
-                    f"error={exc_type.__name__}: {exc_val}"
+                    "[StreamManager] Session failed: session_id=%s, error=%s: %s",
+                    self.session.session_id, exc_type.__name__, exc_val
                 )
 
             # 执行 finalize
@@ -177,27 +192,25 @@ class QueryStreamManager:
                 await self.session.finalize()
                 self._finalized = True
                 logger.debug(
-                    f"[StreamManager] Session finalized in __aexit__: "
-                    f"session_id={self.session.session_id}"
+                    "[StreamManager] Session finalized in __aexit__: session_id=%s",
+                    self.session.session_id
                 )
             except Exception as e:
                 logger.error(
-                    f"[StreamManager] Finalize failed in __aexit__: "
-                    f"session_id={self.session.session_id}, error={e}",
+                    "[StreamManager] Finalize failed in __aexit__: session_id=%s, error=%s",
+                    self.session.session_id, e,
                     exc_info=True
                 )
 
         # ✅ 清理 session 上下文临时文件
         if self.session:
             SessionContext.clear_current_session(session_id=self.session.session_id)
-            logger.debug(f"[StreamManager] Cleared session context: {self.session.session_id}")
+            logger.debug("[StreamManager] Cleared session context: %s", self.session.session_id)
 
         # 恢复上下文（而不是清空）
         if self._context_token:
             reset_current_session(self._context_token)
-            logger.debug(
-                f"[StreamManager] Context reset: token={self._context_token}"
-            )
+            logger.debug("[StreamManager] Context reset: token=%s", self._context_token)
 
         # 不抑制异常，让它继续传播
         return False
@@ -213,8 +226,8 @@ class QueryStreamManager:
         """
         if not self._finalized:
             logger.debug(
-                f"[StreamManager] Finalizing on result: "
-                f"session_id={self.session.session_id if self.session else 'None'}"
+                "[StreamManager] Finalizing on result: session_id=%s",
+                self.session.session_id if self.session else None
             )
 
             if self.session:
@@ -222,13 +235,13 @@ class QueryStreamManager:
                     await self.session.finalize(result_message=result_message)
                     self._finalized = True
                     logger.info(
-                        f"[StreamManager] Session finalized successfully: "
-                        f"session_id={self.session.session_id}"
+                        "[StreamManager] Session finalized successfully: session_id=%s",
+                        self.session.session_id
                     )
                 except Exception as e:
                     logger.error(
-                        f"[StreamManager] Finalize failed: "
-                        f"session_id={self.session.session_id}, error={e}",
+                        "[StreamManager] Finalize failed: session_id=%s, error=%s",
+                        self.session.session_id, e,
                         exc_info=True
                     )
                     # 标记为已 finalize，避免重试
@@ -236,8 +249,8 @@ class QueryStreamManager:
                     raise
         else:
             logger.debug(
-                f"[StreamManager] Finalize skipped (already finalized): "
-                f"session_id={self.session.session_id if self.session else 'None'}"
+                "[StreamManager] Finalize skipped (already finalized): session_id=%s",
+                self.session.session_id if self.session else None
             )
 
     @property
@@ -256,7 +269,8 @@ class QueryStreamManager:
 
     async def __anext__(self):
         """异步迭代器的下一个方法"""
-        # 确保 session 已初始化（第一次迭代时）
+        # 确保 session 已初始化（未经 initialize()/async with 直接迭代时）。
+        # 注意：async for 从类型上查找 __anext__，无法在实例上替换为免检查版本
         if not self._initialized:
             await self.initialize()
 
@@ -265,12 +279,12 @@ class QueryStreamManager:
             message = await self.stream.__anext__()
 
             # 记录消息
-            if self.session:
-                await self.session.record_message(message)
+            record = self._record
+            if record is not None:
+                await record(message)
 
                 # 如果是 ResultMessage，执行 finalize
-                from claude_agent_sdk import ResultMessage
-                if isinstance(message, ResultMessage):
+                if _ResultMessage is not None and isinstance(message, _ResultMessage):
                     await self.finalize_on_result(message)
 
             return message
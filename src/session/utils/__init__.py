@@ -16,7 +16,8 @@ from .query_helpers import (
     export_session_to_text,
     export_session_to_jsonl,
     build_tree_node,
-    flatten_tree_to_list
+    flatten_tree_to_list,
+    iter_tree_nodes
 )
 
 __all__ = [
@@ -34,5 +35,6 @@ __all__ = [
     "export_session_to_text",
     "export_session_to_jsonl",
     "build_tree_node",
-    "flatten_tree_to_list"
+    "flatten_tree_to_list",
+    "iter_tree_nodes"
 ]
@@ -7,12 +7,60 @@
 - 实例路径管理
 """
 
+import os
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 已解析结果缓存：(实例根目录, session_id) -> 实例名称
+# 只缓存命中结果，使用前以一次 stat 校验路径仍然存在
+_SESSION_INSTANCE_CACHE: Dict[Tuple[str, str], str] = {}
+_CACHE_MAX_ENTRIES = 4096
+
+# 工具别名索引：实例根目录 -> (根目录 st_mtime_ns, {别名: 实例名称})
+# 实例目录增删会改变根目录 mtime，据此判断索引是否需要重建
+_ALIAS_INDEX: Dict[str, Tuple[int, Dict[str, str]]] = {}
+
+# 别名匹配优先级（与命名模式 {alias}_agent / {alias} / {alias}_instance 的尝试顺序一致）
+_ALIAS_SUFFIXES = (("_agent", 0), ("", 1), ("_instance", 2))
+
+
+def _cache_put(cache: Dict[Tuple[str, str], str], key: Tuple[str, str], value: str) -> None:
+    """写入缓存（超过上限时整体清空）"""
+    if len(cache) >= _CACHE_MAX_ENTRIES:
+        cache.clear()
+    cache[key] = value
+
+
+def _build_alias_index(instances_root: str) -> Dict[str, str]:
+    """
+    扫描实例根目录，构建 {工具别名: 实例名称} 映射
+
+    Args:
+        instances_root: 实例根目录
+
+    Returns:
+        别名映射（同一别名对应多个实例时按 _agent、原名、_instance 的顺序取优先者）
+
+    Raises:
+        FileNotFoundError: 实例根目录不存在
+    """
+    index: Dict[str, str] = {}
+    priorities: Dict[str, int] = {}
+    with os.scandir(instances_root) as entries:
+        for entry in entries:
+            name = entry.name
+            for suffix, priority in _ALIAS_SUFFIXES:
+                if suffix and not name.endswith(suffix):
+                    continue
+                alias = name[:-len(suffix)] if suffix else name
+                if priority < priorities.get(alias, len(_ALIAS_SUFFIXES)):
+                    priorities[alias] = priority
+                    index[alias] = name
+    return index
+
 
 def infer_instance_name(session_id: str, instances_root: Optional[Path] = None) -> Optional[str]:
     """
@@ -36,25 +84,29 @@ def infer_instance_name(session_id: str, instances_root: Optional[Path] = None)
 
     instances_root = Path(instances_root)
 
-    if not instances_root.exists():
+    # 缓存命中：只需确认会话目录仍然存在
+    cache_key = (str(instances_root), session_id)
+    cached = _SESSION_INSTANCE_CACHE.get(cache_key)
+    if cached is not None:
+        if os.path.exists(os.path.join(cache_key[0], cached, "sessions", session_id)):
+            return cached
+        del _SESSION_INSTANCE_CACHE[cache_key]
+
+    # 遍历所有实例目录（os.scandir 的目录项自带类型信息，普通目录无需逐个 stat）
+    try:
+        with os.scandir(instances_root) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+
+                # 检查该实例下是否存在该 session_id 的会话目录
+                if os.path.exists(os.path.join(entry.path, "sessions", session_id)):
+                    _cache_put(_SESSION_INSTANCE_CACHE, cache_key, entry.name)
+                    return entry.name
+    except FileNotFoundError:
         logger.warning(f"实例根目录不存在: {instances_root}")
         return None
 
-    # 遍历所有实例目录
-    for instance_dir in instances_root.iterdir():
-        if not instance_dir.is_dir():
-            continue
-
-        # 检查该实例的 sessions 目录
-        sessions_dir = instance_dir / "sessions"
-        if not sessions_dir.exists():
-            continue
-
-        # 检查是否存在该 session_id 的目录
-        session_dir = sessions_dir / session_id
-        if session_dir.exists():
-            return instance_dir.name
-
     logger.warning(f"无法推断 session_id {session_id} 的实例名称")
     return None
 
@@ -96,17 +148,26 @@ def extract_instance_from_tool_name(
 
     instances_root = Path(instances_root)
 
-    # 尝试几种常见的命名模式
-    possible_names = [
-        f"{instance_alias}_agent",
-        f"{instance_alias}",
-        f"{instance_alias}_instance"
-    ]
+    # 根目录 mtime 未变化时直接复用别名索引，每次查找只需一次 stat
+    root = str(instances_root)
+    try:
+        mtime_ns = os.stat(root).st_mtime_ns
+    except FileNotFoundError:
+        logger.warning(f"实例根目录不存在: {instances_root}")
+        return None
+
+    cached = _ALIAS_INDEX.get(root)
+    if cached is None or cached[0] != mtime_ns:
+        try:
+            cached = (mtime_ns, _build_alias_index(root))
+        except FileNotFoundError:
+            logger.warning(f"实例根目录不存在: {instances_root}")
+            return None
+        _ALIAS_INDEX[root] = cached
 
-    for name in possible_names:
-        instance_path = instances_root / name
-        if instance_path.exists():
-            return name
+    name = cached[1].get(instance_alias)
+    if name is not None:
+        return name
 
     logger.warning(f"无法从工具名称 {tool_name} 推断实例名称")
     return None
@@ -196,15 +257,15 @@ def list_all_instances(instances_root: Optional[Path] = None) -> list[str]:
 
     instances_root = Path(instances_root)
 
-    if not instances_root.exists():
+    instances = []
+    try:
+        with os.scandir(instances_root) as entries:
+            for entry in entries:
+                # 验证是否是有效的实例目录（至少有 config.yaml）
+                if entry.is_dir() and os.path.exists(os.path.join(entry.path, "config.yaml")):
+                    instances.append(entry.name)
+    except FileNotFoundError:
         logger.warning(f"实例根目录不存在: {instances_root}")
         return []
 
-    instances = []
-    for item in instances_root.iterdir():
-        if item.is_dir():
-            # 验证是否是有效的实例目录（至少有 config.yaml）
-            if (item / "config.yaml").exists():
-                instances.append(item.name)
-
     return sorted(instances)
@@ -6,15 +6,78 @@
 保持 SessionQuery 类的干净和整洁。
 """
 
-import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from ...error_handling import AgentSystemError
+from ...json_utils import dumps_bytes, loads as json_loads
 from ...logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# 并行读取 statistics.json 的最大线程数
+_STATS_SCAN_WORKERS = 32
+
+# 搜索用小写文本缓存：(session_id, 字段, 条目数) -> 小写文本元组
+_SEARCH_TEXT_CACHE: Dict[Tuple[Any, str, int], Tuple[str, ...]] = {}
+_SEARCH_CACHE_MAX_ENTRIES = 10000
+
+# 导出文件的写缓冲区大小
+_EXPORT_BUFFER_SIZE = 1024 * 1024
+
+
+def _load_session_stats(session_manager, session_id: str) -> Optional[Dict[str, Any]]:
+    """
+    读取单个会话的 statistics.json
+
+    会话目录固定为 sessions/{session_id}，直接拼接路径，无需构造 Session 对象。
+
+    Args:
+        session_manager: SessionManager 实例
+        session_id: 会话 ID
+
+    Returns:
+        统计信息字典，文件不存在时返回 None
+    """
+    try:
+        with open(os.path.join(session_manager.sessions_dir, session_id, "statistics.json"), 'rb') as f:
+            return json_loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def _load_session_stats_safe(session_manager, session_id: str) -> Optional[Dict[str, Any]]:
+    """读取会话统计信息，失败时记录警告并返回 None"""
+    try:
+        return _load_session_stats(session_manager, session_id)
+    except Exception as e:
+        logger.warning(f"读取会话统计失败 {session_id}: {e}")
+        return None
+
+
+def _load_session_stats_batch(session_manager, session_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """
+    批量读取会话统计信息（有界线程池并行读取，结果保持输入顺序）
+
+    Args:
+        session_manager: SessionManager 实例
+        session_ids: 会话 ID 列表
+
+    Returns:
+        统计信息列表（读取失败或不存在的项为 None）
+    """
+    if len(session_ids) <= 1:
+        return [_load_session_stats_safe(session_manager, session_id) for session_id in session_ids]
+
+    with ThreadPoolExecutor(max_workers=min(_STATS_SCAN_WORKERS, len(session_ids))) as executor:
+        return list(executor.map(
+            lambda session_id: _load_session_stats_safe(session_manager, session_id),
+            session_ids
+        ))
+
 
 def calculate_session_statistics(all_sessions: List[Dict[str, Any]], session_manager, recent_days: Optional[int] = None) -> Dict[str, Any]:
     """
@@ -29,54 +92,47 @@ def calculate_session_statistics(all_sessions: List[Dict[str, Any]], session_man
         统计摘要字典
     """
     try:
-        # 过滤时间范围
+        # start_time 为 datetime.isoformat() 生成的本地时间字符串，直接与截止时间的 ISO 字符串比较，无需逐条解析。
+        # isoformat() 在微秒为 0 时省略 .ffffff，因此字符串并非定宽；但 YYYY-MM-DDTHH:MM:SS 部分定宽，
+        # 字典序在秒级上与时间序一致。截止时间固定带微秒输出，仅同一秒内且微秒为 0 的边界会话被视为早于截止时间
+        cutoff_iso = None
         if recent_days:
-            cutoff_time = datetime.now().timestamp() - (recent_days * 24 * 60 * 60)
-            filtered_sessions = []
-            for session_meta in all_sessions:
-                start_time_str = session_meta.get('start_time')
-                if start_time_str:
-                    start_time = datetime.fromisoformat(start_time_str).timestamp()
-                    if start_time >= cutoff_time:
-                        filtered_sessions.append(session_meta)
-            all_sessions = filtered_sessions
+            cutoff_iso = (datetime.now() - timedelta(days=recent_days)).isoformat(timespec="microseconds")
 
-        # 统计
-        total_sessions = len(all_sessions)
+        # 单次遍历元数据：过滤时间范围、统计状态、收集需要读取统计信息的会话
+        session_ids = []
         completed_sessions = 0
         failed_sessions = 0
-        total_messages = 0
-        total_tool_calls = 0
-        total_cost_usd = 0.0
-        total_duration_ms = 0
-        duration_count = 0
-
         for session_meta in all_sessions:
+            if cutoff_iso is not None and (session_meta.get('start_time') or '') < cutoff_iso:
+                continue
+
+            session_ids.append(session_meta.get('session_id'))
+
             status = session_meta.get('status', 'unknown')
             if status == 'completed':
                 completed_sessions += 1
             elif status == 'failed':
                 failed_sessions += 1
 
-            # 读取统计信息
-            session_id = session_meta.get('session_id')
-            try:
-                session = session_manager.get_session(session_id)
-                stats_file = session.session_dir / "statistics.json"
-                if stats_file.exists():
-                    with open(stats_file, 'r', encoding='utf-8') as f:
-                        stats = json.load(f)
-
-                    total_messages += stats.get('num_messages', 0)
-                    total_tool_calls += stats.get('num_tool_calls', 0)
-                    total_cost_usd += stats.get('cost_usd', 0) or 0
-
-                    duration = stats.get('total_duration_ms', 0)
-                    if duration > 0:
-                        total_duration_ms += duration
-                        duration_count += 1
-            except Exception as e:
-                logger.warning(f"读取会话统计失败 {session_id}: {e}")
+        # 统计
+        total_sessions = len(session_ids)
+        total_messages = 0
+        total_tool_calls = 0
+        total_cost_usd = 0.0
+        total_duration_ms = 0
+        duration_count = 0
+
+        for stats in _load_session_stats_batch(session_manager, session_ids):
+            if stats:
+                total_messages += stats.get('num_messages', 0)
+                total_tool_calls += stats.get('num_tool_calls', 0)
+                total_cost_usd += stats.get('cost_usd', 0) or 0
+
+                duration = stats.get('total_duration_ms', 0)
+                if duration > 0:
+                    total_duration_ms += duration
+                    duration_count += 1
 
         avg_duration_ms = total_duration_ms / duration_count if duration_count > 0 else 0
 
@@ -96,6 +152,52 @@ def calculate_session_statistics(all_sessions: List[Dict[str, Any]], session_man
         raise AgentSystemError(f"计算统计摘要失败: {e}")
 
 
+def _search_texts(session_meta: Dict[str, Any], field: str) -> Tuple[str, ...]:
+    """
+    获取会话在指定字段上的小写搜索文本
+
+    结果按 (session_id, 字段, 条目数) 缓存：初始提示词不会改变，
+    结果列表只会追加（resume 后条目数变化即生成新缓存项）。
+
+    Args:
+        session_meta: 会话元数据
+        field: 搜索字段（initial_prompt/result）
+
+    Returns:
+        小写文本元组
+    """
+    if field == "initial_prompt":
+        items = session_meta.get('prompts') or ()
+        count = 1 if items else 0
+    elif field == "result":
+        items = session_meta.get('results') or ()
+        count = len(items)
+    else:
+        return ()
+
+    if not count:
+        return ()
+
+    session_id = session_meta.get('session_id')
+    key = (session_id, field, count)
+    if session_id is not None:
+        texts = _SEARCH_TEXT_CACHE.get(key)
+        if texts is not None:
+            return texts
+
+    if field == "initial_prompt":
+        texts = ((items[0].get('prompt') or '').lower(),)
+    else:
+        texts = tuple((result.get('result') or '').lower() for result in items)
+
+    if session_id is not None:
+        if len(_SEARCH_TEXT_CACHE) >= _SEARCH_CACHE_MAX_ENTRIES:
+            _SEARCH_TEXT_CACHE.clear()
+        _SEARCH_TEXT_CACHE[key] = texts
+
+    return texts
+
+
 def search_sessions_in_list(
     all_sessions: List[Dict[str, Any]],
     query: str,
@@ -117,29 +219,16 @@ def search_sessions_in_list(
     try:
         matched_sessions = []
 
+        # 关键词只需小写化一次（子串匹配用 in，比正则更快）
+        query_lower = query.lower()
+
         for session_meta in all_sessions:
-            match_found = False
-
-            if field == "initial_prompt":
-                # 搜索初始提示词
-                if 'prompts' in session_meta and session_meta['prompts']:
-                    first_prompt = session_meta['prompts'][0].get('prompt', '')
-                    if query.lower() in first_prompt.lower():
-                        match_found = True
-
-            elif field == "result":
-                # 搜索结果
-                if 'results' in session_meta and session_meta['results']:
-                    for result in session_meta['results']:
-                        if query.lower() in result.get('result', '').lower():
-                            match_found = True
-                            break
-
-            if match_found:
+            # 搜索初始提示词或结果（小写文本按会话缓存，重复搜索无需再次转换）
+            if any(query_lower in text for text in _search_texts(session_meta, field)):
                 matched_sessions.append(session_meta)
 
-            if len(matched_sessions) >= limit:
-                break
+                if len(matched_sessions) >= limit:
+                    break
 
         return matched_sessions
 
@@ -156,25 +245,40 @@ def export_session_to_text(output_file: Path, session_id: str, data: Dict[str, A
         session_id: 会话 ID
         data: 会话数据
     """
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(f"=== Session: {session_id} ===\n\n")
-        f.write(f"Instance: {data['metadata']['instance_name']}\n")
-        f.write(f"Status: {data['metadata']['status']}\n")
-        f.write(f"Start Time: {data['metadata']['start_time']}\n")
-        f.write(f"End Time: {data['metadata'].get('end_time', 'N/A')}\n")
-        f.write(f"\n=== Statistics ===\n")
-        f.write(f"Messages: {data['statistics']['num_messages']}\n")
-        f.write(f"Tool Calls: {data['statistics']['num_tool_calls']}\n")
-        f.write(f"Duration: {data['statistics']['total_duration_ms']}ms\n")
-        f.write(f"Cost: ${data['statistics'].get('cost_usd', 0)}\n")
-
-        if 'messages' in data:
-            f.write(f"\n=== Messages ===\n")
-            for msg in data["messages"]:
-                f.write(f"\n[{msg['seq']}] {msg['message_type']} @ {msg['timestamp']}\n")
-
-
-def export_session_to_jsonl(output_file: Path, data: Dict[str, Any], include_messages: bool = True) -> None:
+    metadata = data['metadata']
+    statistics = data['statistics']
+
+    # 先在内存中拼接全部文本，再一次性写出
+    parts = [
+        f"=== Session: {session_id} ===\n\n"
+        f"Instance: {metadata['instance_name']}\n"
+        f"Status: {metadata['status']}\n"
+        f"Start Time: {metadata['start_time']}\n"
+        f"End Time: {metadata.get('end_time', 'N/A')}\n"
+        f"\n=== Statistics ===\n"
+        f"Messages: {statistics['num_messages']}\n"
+        f"Tool Calls: {statistics['num_tool_calls']}\n"
+        f"Duration: {statistics['total_duration_ms']}ms\n"
+        f"Cost: ${statistics.get('cost_usd', 0)}\n"
+    ]
+
+    if 'messages' in data:
+        parts.append("\n=== Messages ===\n")
+        parts.extend(
+            f"\n[{msg['seq']}] {msg['message_type']} @ {msg['timestamp']}\n"
+            for msg in data["messages"]
+        )
+
+    with open(output_file, 'w', encoding='utf-8', buffering=_EXPORT_BUFFER_SIZE) as f:
+        f.write("".join(parts))
+
+
+def export_session_to_jsonl(
+    output_file: Path,
+    data: Dict[str, Any],
+    include_messages: bool = True,
+    messages: Optional[Iterable[Dict[str, Any]]] = None
+) -> None:
     """
     导出会话为 JSONL 格式
 
@@ -182,19 +286,21 @@ def export_session_to_jsonl(output_file: Path, data: Dict[str, Any], include_mes
         output_file: 输出文件路径
         data: 会话数据
         include_messages: 是否包含消息
+        messages: 消息迭代器（可选，提供时替代 data["messages"]，逐条写出）
     """
-    with open(output_file, 'w', encoding='utf-8') as f:
-        # 写入元数据
-        json.dump({"type": "metadata", "data": data["metadata"]}, f, ensure_ascii=False)
-        f.write('\n')
-        # 写入统计信息
-        json.dump({"type": "statistics", "data": data["statistics"]}, f, ensure_ascii=False)
-        f.write('\n')
+    # 二进制写入，1 MiB 用户态缓冲区合并逐行写入
+    with open(output_file, 'wb', buffering=_EXPORT_BUFFER_SIZE) as f:
+        # 写入元数据与统计信息
+        f.write(
+            dumps_bytes({"type": "metadata", "data": data["metadata"]}) + b'\n'
+            + dumps_bytes({"type": "statistics", "data": data["statistics"]}) + b'\n'
+        )
         # 写入消息
-        if include_messages and 'messages' in data:
-            for msg in data["messages"]:
-                json.dump({"type": "message", "data": msg}, f, ensure_ascii=False)
-                f.write('\n')
+        if messages is None and include_messages:
+            messages = data.get("messages")
+        if include_messages and messages is not None:
+            for msg in messages:
+                f.write(dumps_bytes({"type": "message", "data": msg}) + b'\n')
 
 
 
@@ -233,26 +339,41 @@ def build_tree_node(
     return tree_node
 
 
-def flatten_tree_to_list(tree: Dict[str, Any]) -> List[Dict[str, Any]]:
+def iter_tree_nodes(tree: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
     """
-    将树形结构展平为列表
+    按深度优先顺序逐个产出会话树节点（不包含 subsessions）
+
+    显式栈迭代遍历，深层嵌套的会话树不受递归深度限制；
+    调用方只需遍历时无需构建中间列表。
 
     Args:
         tree: 会话树
 
-    Returns:
-        会话列表（按深度优先顺序）
+    Yields:
+        节点信息字典
     """
-    result = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
 
-    def traverse(node: Dict[str, Any]):
         # 提取节点信息（不包含 subsessions）
-        node_info = {k: v for k, v in node.items() if k != "subsessions"}
-        result.append(node_info)
+        node_info = node.copy()
+        children = node_info.pop("subsessions", None)
+        yield node_info
+
+        # 子节点逆序入栈以保持深度优先顺序
+        if children:
+            stack.extend(reversed(children))
+
 
-        # 递归遍历子节点
-        for child in node.get("subsessions", []):
-            traverse(child)
+def flatten_tree_to_list(tree: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    将树形结构展平为列表
 
-    traverse(tree)
-    return result
\ No newline at end of file
+    Args:
+        tree: 会话树
+
+    Returns:
+        会话列表（按深度优先顺序）
+    """
+    return list(iter_tree_nodes(tree))
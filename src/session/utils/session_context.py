@@ -3,17 +3,22 @@ Session 上下文管理器
 
 使用临时文件在进程间传递当前会话的 session_id，
 用于子实例自动获取父会话 ID，无需 Claude 手动传递。
+同进程内的读取优先使用 ContextVar，不访问文件系统。
 """
 
-import json
 import os
 import tempfile
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+from ...json_utils import dumps_bytes, loads as json_loads
 from ...logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# 当前异步上下文中的会话 ID（同进程内传递，无需读写临时文件）
+_CURRENT_SESSION: ContextVar[Optional[str]] = ContextVar("session_context_current", default=None)
+
 
 class SessionContext:
     """
@@ -26,6 +31,24 @@ class SessionContext:
     # 临时文件路径（使用进程 ID 避免冲突）
     _temp_dir = Path(tempfile.gettempdir()) / "claude_agent_sessions"
 
+    # 本进程最近设置的会话：(pid, session_id)，等价于进程级文件的内存副本
+    # （记录 pid 以便 fork 出的子进程不会误用父进程的值）
+    _process_session: Optional[Tuple[int, str]] = None
+
+    # 最近一次成功写入临时文件的上下文：(session_id, instance_path, pid)
+    # 重复设置相同上下文且专属文件仍存在时跳过文件写入；清除上下文或清理文件后重置
+    _last_written: Optional[Tuple[str, str, int]] = None
+
+    @staticmethod
+    def _file_ipc_enabled() -> bool:
+        """
+        是否通过临时文件跨进程传递上下文
+
+        MCP 服务器子进程依赖临时文件获取父 session_id，默认开启；
+        父子实例都在同一进程内运行时可设置 SESSION_CONTEXT_IPC=memory 关闭。
+        """
+        return os.getenv("SESSION_CONTEXT_IPC", "file") != "memory"
+
     @classmethod
     def _get_context_file(cls, pid: Optional[int] = None) -> Path:
         """
@@ -63,48 +86,112 @@ class SessionContext:
             # 兼容模式：返回最新的全局文件
             return cls._temp_dir / "session_context_latest.json"
 
+    @classmethod
+    def _write_context_file(cls, path: Path, payload: bytes) -> None:
+        """写入上下文文件（单次 os.write，不经过 Python 文件对象）"""
+        # os.open 默认即不可继承（PEP 446），显式加 O_CLOEXEC 以表明意图（Windows 无此标志）
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_CLOEXEC", 0)
+        fd = os.open(path, flags, 0o600)
+        try:
+            os.write(fd, payload)
+        finally:
+            os.close(fd)
+
+    @classmethod
+    def _replace_context_file(cls, path: Path, payload: bytes) -> None:
+        """原子替换上下文文件内容（先写同目录临时文件再 os.replace，读取方不会看到半写入的文件）"""
+        import time
+
+        tmp_file = cls._temp_dir / f"session_context_tmp_{os.getpid()}_{time.monotonic_ns()}.json"
+        cls._write_context_file(tmp_file, payload)
+        try:
+            os.replace(tmp_file, path)
+        except OSError:
+            tmp_file.unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def _link_context_file(cls, target: Path, link: Path, payload: bytes) -> None:
+        """
+        将 link 原子替换为指向 target 的符号链接
+
+        先在同目录创建临时链接再 os.replace，读取方不会看到半写入的文件；
+        平台不支持符号链接时退化为直接写入内容。
+
+        Args:
+            target: 链接目标（session_id 专属文件）
+            link: 链接路径（进程级文件）
+            payload: 不支持符号链接时写入的内容
+        """
+        import time
+
+        tmp_link = cls._temp_dir / f"session_context_tmp_{os.getpid()}_{time.monotonic_ns()}.json"
+        try:
+            os.symlink(target, tmp_link)
+        except (OSError, NotImplementedError):
+            cls._write_context_file(link, payload)
+            return
+
+        try:
+            os.replace(tmp_link, link)
+        except OSError:
+            tmp_link.unlink(missing_ok=True)
+            raise
+
     @classmethod
     def set_current_session(cls, session_id: str, instance_path: str) -> None:
         """
-        设置当前会话上下文（写入临时文件）
+        设置当前会话上下文（写入 ContextVar 和临时文件）
 
-        写入三个文件：
-        1. 进程级文件（用于同进程内访问）
-        2. session_id 专属文件（支持并发，子进程可根据 session_id 读取）
-        3. latest 指针文件（记录最新的 session_id，兼容模式）
+        上下文只序列化一次（SESSION_CONTEXT_IPC=memory 时跳过文件写入）：
+        1. session_id 专属文件（支持并发，子进程可根据 session_id 读取）
+        2. 进程级文件（用于同进程内访问，指向 1 的符号链接，随会话清除删除）
+        3. latest 指针文件（记录最新的 session_id，兼容模式；独立的普通文件、原子替换，
+           会话清除后仍保留最后一次的 session_id，供 MCP 子进程回退读取）
 
         Args:
             session_id: 会话 ID
             instance_path: 实例路径
         """
+        pid = os.getpid()
+        _CURRENT_SESSION.set(session_id)
+        cls._process_session = (pid, session_id)
+        if not cls._file_ipc_enabled():
+            logger.debug(f"[SessionContext] Set in-process session context: {session_id}")
+            return
+
+        written_key = (session_id, str(instance_path), pid)
+        session_file = cls._get_global_context_file(session_id)
+        # 文件可能已被其他进程的 cleanup_all() 删除，确认仍存在才跳过写入
+        if cls._last_written == written_key and os.path.lexists(session_file):
+            logger.debug(f"[SessionContext] Session context unchanged, skip writing: {session_id}")
+            return
+
         import time
 
         context_data = {
             "session_id": session_id,
-            "instance_path": str(instance_path),
-            "pid": os.getpid(),
+            "instance_path": written_key[1],
+            "pid": pid,
             "timestamp": time.time()
         }
 
         try:
-            # 1. 写入进程级文件
-            context_file = cls._get_context_file()
-            with open(context_file, 'w', encoding='utf-8') as f:
-                json.dump(context_data, f)
+            payload = dumps_bytes(context_data)
+
+            # 1. 写入 session_id 专属文件（避免并发冲突）
+            cls._write_context_file(session_file, payload)
 
-            # 2. 写入 session_id 专属文件（避免并发冲突）
-            session_file = cls._get_global_context_file(session_id)
-            with open(session_file, 'w', encoding='utf-8') as f:
-                json.dump(context_data, f)
+            # 2. 进程级文件指向专属文件
+            cls._link_context_file(session_file, cls._get_context_file(), payload)
 
-            # 3. 写入 latest 指针文件（记录当前进程的最新 session_id）
-            latest_file = cls._get_global_context_file(None)
-            with open(latest_file, 'w', encoding='utf-8') as f:
-                json.dump(context_data, f)
+            # 3. latest 指针文件（普通文件，原子替换；不使用符号链接，避免会话清除后失效）
+            cls._replace_context_file(cls._get_global_context_file(None), payload)
 
+            cls._last_written = written_key
             logger.debug(
                 f"[SessionContext] Set session context: {session_id} "
-                f"(pid={os.getpid()}, files=3)"
+                f"(pid={pid}, files=2, links=1)"
             )
 
         except Exception as e:
@@ -113,11 +200,13 @@ class SessionContext:
     @classmethod
     def get_current_session(cls, pid: Optional[int] = None) -> Optional[str]:
         """
-        获取当前会话 ID（从临时文件读取）
+        获取当前会话 ID
 
         查找顺序：
-        1. 先尝试读取进程级文件（同进程内）
-        2. 读取 latest 指针文件（跨进程场景，获取最新的 session_id）
+        1. 当前异步上下文的 ContextVar（查询本进程时，不访问文件系统）
+        2. 本进程最近设置的会话（内存副本，查询本进程时代替进程级文件）
+        3. 进程级文件（查询其他进程时）
+        4. latest 指针文件（跨进程场景，获取最新的 session_id）
 
         Args:
             pid: 进程 ID（默认使用当前进程）
@@ -125,43 +214,44 @@ class SessionContext:
         Returns:
             会话 ID，如果不存在则返回 None
         """
-        # 1. 尝试读取进程级文件（同进程场景）
-        context_file = cls._get_context_file(pid)
-
-        if context_file.exists():
-            try:
-                with open(context_file, 'r', encoding='utf-8') as f:
-                    context_data = json.load(f)
-
-                session_id = context_data.get("session_id")
-                logger.debug(
-                    f"[SessionContext] Get from process file: {session_id} "
-                    f"(pid={pid or os.getpid()})"
-                )
+        current_pid = os.getpid()
+        if pid is None or pid == current_pid:
+            # 1. 同进程内直接读取 ContextVar
+            session_id = _CURRENT_SESSION.get()
+            if session_id is not None:
                 return session_id
 
-            except Exception as e:
-                logger.warning(f"[SessionContext] Failed to read process file: {e}")
+            # 2. 本进程最近设置的会话（进程级文件只由本进程写入，无需再读文件）
+            process_session = cls._process_session
+            if process_session is not None and process_session[0] == current_pid:
+                return process_session[1]
+            candidates = []
+        else:
+            # 3. 其他进程的进程级文件
+            candidates = [("process", cls._get_context_file(pid))]
 
-        # 2. 尝试读取 latest 指针文件（跨进程场景）
-        latest_file = cls._get_global_context_file(None)
+        # 4. latest 指针文件（跨进程场景）
+        candidates.append(("latest", cls._get_global_context_file(None)))
 
-        if latest_file.exists():
+        # 直接打开读取（文件不存在时捕获异常），无需先 exists() 检查
+        for source, context_file in candidates:
             try:
-                with open(latest_file, 'r', encoding='utf-8') as f:
-                    context_data = json.load(f)
-
-                session_id = context_data.get("session_id")
-                logger.debug(
-                    f"[SessionContext] Get from latest file: {session_id} "
-                    f"(pid={pid or os.getpid()})"
-                )
-                return session_id
-
+                with open(context_file, 'rb') as f:
+                    context_data = json_loads(f.read())
+            except FileNotFoundError:
+                continue
             except Exception as e:
-                logger.warning(f"[SessionContext] Failed to read latest file: {e}")
+                logger.warning(f"[SessionContext] Failed to read {source} file: {e}")
+                continue
+
+            session_id = context_data.get("session_id")
+            logger.debug(
+                f"[SessionContext] Get from {source} file: {session_id} "
+                f"(pid={pid or current_pid})"
+            )
+            return session_id
 
-        logger.debug(f"[SessionContext] No session context found (pid={pid or os.getpid()})")
+        logger.debug(f"[SessionContext] No session context found (pid={pid or current_pid})")
         return None
 
     @classmethod
@@ -175,27 +265,25 @@ class SessionContext:
         Returns:
             会话上下文数据，如果不存在则返回 None
         """
-        session_file = cls._get_global_context_file(session_id)
-
-        if session_file.exists():
-            try:
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    context_data = json.load(f)
-
-                logger.debug(f"[SessionContext] Get session by ID: {session_id}")
-                return context_data
-
-            except Exception as e:
-                logger.warning(f"[SessionContext] Failed to read session file: {e}")
+        # 直接打开读取，文件不存在时返回 None（无需先 exists() 检查）
+        try:
+            with open(cls._get_global_context_file(session_id), 'rb') as f:
+                context_data = json_loads(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"[SessionContext] Failed to read session file: {e}")
+            return None
 
-        return None
+        logger.debug(f"[SessionContext] Get session by ID: {session_id}")
+        return context_data
 
     @classmethod
     def clear_current_session(cls, pid: Optional[int] = None, session_id: Optional[str] = None) -> None:
         """
-        清除当前会话上下文（删除临时文件）
+        清除当前会话上下文（重置 ContextVar 并删除临时文件）
 
-        删除：
+        删除（SESSION_CONTEXT_IPC=memory 时没有文件需要删除）：
         1. 进程级文件
         2. session_id 专属文件（如果提供了 session_id）
         3. latest 指针文件（可选，避免影响其他并发会话）
@@ -204,19 +292,26 @@ class SessionContext:
             pid: 进程 ID（默认使用当前进程）
             session_id: 会话 ID（可选，用于删除特定会话的文件）
         """
+        if pid is None or pid == os.getpid():
+            if session_id is None or _CURRENT_SESSION.get() == session_id:
+                _CURRENT_SESSION.set(None)
+            process_session = cls._process_session
+            if process_session is not None and (session_id is None or process_session[1] == session_id):
+                cls._process_session = None
+            cls._last_written = None
+        if not cls._file_ipc_enabled():
+            return
+
         try:
-            # 1. 删除进程级文件
-            context_file = cls._get_context_file(pid)
-            if context_file.exists():
-                context_file.unlink()
+            # 1. 删除进程级文件（可能是符号链接，exists() 对失效链接返回 False，直接删除）
+            cls._get_context_file(pid).unlink(missing_ok=True)
 
             # 2. 删除 session_id 专属文件
             if session_id:
-                session_file = cls._get_global_context_file(session_id)
-                if session_file.exists():
-                    session_file.unlink()
+                cls._get_global_context_file(session_id).unlink(missing_ok=True)
 
             # 注意：不删除 latest 指针文件，避免影响其他并发会话
+            # （latest 是独立的普通文件，保留最后一次设置的 session_id）
 
             logger.debug(
                 f"[SessionContext] Cleared session context "
@@ -231,13 +326,19 @@ class SessionContext:
         """
         清理所有临时文件（启动时调用，清理上次未清理的文件）
         """
+        cls._last_written = None
         try:
-            if cls._temp_dir.exists():
-                for file in cls._temp_dir.glob("session_context_*.json"):
-                    try:
-                        file.unlink()
-                    except Exception:
-                        pass
-                logger.debug("[SessionContext] Cleaned up all session context files")
+            # 单次目录扫描 + 文件名前后缀匹配，逐项直接 unlink（无需 stat）
+            with os.scandir(cls._temp_dir) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if name.startswith("session_context_") and name.endswith(".json"):
+                        try:
+                            os.unlink(entry.path)
+                        except OSError:
+                            pass
+            logger.debug("[SessionContext] Cleaned up all session context files")
+        except FileNotFoundError:
+            pass
         except Exception as e:
             logger.warning(f"[SessionContext] Failed to cleanup all context files: {e}")
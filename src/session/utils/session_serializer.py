@@ -4,12 +4,188 @@
 负责将 Claude SDK 消息对象序列化为 JSON 可存储的格式
 """
 
-from typing import Any
+from typing import Any, Callable, Dict, Tuple
+from ...json_utils import dumps_bytes
 from ...logging_config import get_logger
 
 logger = get_logger(__name__)
 
 
+def _serialize_assistant(message: Any) -> dict:
+    """序列化 AssistantMessage"""
+    return {
+        "model": message.model,
+        "content": [MessageSerializer._serialize_content_block(b) for b in message.content]
+    }
+
+
+def _serialize_result(message: Any) -> dict:
+    """序列化 ResultMessage"""
+    return {
+        "subtype": message.subtype,
+        "duration_ms": message.duration_ms,
+        "duration_api_ms": message.duration_api_ms,
+        "is_error": message.is_error,
+        "num_turns": message.num_turns,
+        "session_id": getattr(message, 'session_id', None),
+        "total_cost_usd": message.total_cost_usd,
+        "usage": message.usage,
+        "result": message.result
+    }
+
+
+def _serialize_user(message: Any) -> dict:
+    """序列化 UserMessage"""
+    content = message.content
+    if isinstance(content, str):
+        content_data = content
+    else:
+        content_data = [MessageSerializer._serialize_content_block(b) for b in content]
+
+    return {
+        "role": "user",
+        "content": content_data
+    }
+
+
+def _serialize_system(message: Any) -> dict:
+    """序列化 SystemMessage"""
+    return {
+        "subtype": message.subtype,
+        "data": message.data
+    }
+
+
+def _serialize_text_block(block: Any) -> dict:
+    """序列化 TextBlock"""
+    return {
+        "type": "text",
+        "text": block.text
+    }
+
+
+def _serialize_tool_use_block(block: Any) -> dict:
+    """序列化 ToolUseBlock"""
+    return {
+        "type": "tool_use",
+        "id": block.id,
+        "name": block.name,
+        "input": block.input
+    }
+
+
+def _serialize_tool_result_block(block: Any) -> dict:
+    """序列化 ToolResultBlock"""
+    return {
+        "type": "tool_result",
+        "tool_use_id": block.tool_use_id,
+        "content": block.content,
+        "is_error": block.is_error
+    }
+
+
+def _serialize_other_block(block: Any) -> Any:
+    """序列化未注册的内容块（ThinkingBlock 或通用对象）"""
+    if hasattr(block, 'thinking'):
+        return {
+            "type": "thinking",
+            "thinking": block.thinking,
+            "signature": getattr(block, 'signature', None)
+        }
+    return _generic_serialize(block)
+
+
+# 无需递归处理的基础类型
+_PRIMITIVE_TYPES = frozenset((str, int, float, bool, type(None)))
+
+# 类型 -> 公开 __slots__ 属性名（含基类，逐类型缓存）
+_SLOT_NAMES: Dict[type, Tuple[str, ...]] = {}
+
+
+def _slot_names(cls: type) -> Tuple[str, ...]:
+    """获取类型（含基类）声明的公开 __slots__ 属性名"""
+    names = _SLOT_NAMES.get(cls)
+    if names is None:
+        collected = []
+        for klass in reversed(cls.__mro__):
+            slots = klass.__dict__.get('__slots__', ())
+            if isinstance(slots, str):
+                slots = (slots,)
+            collected.extend(name for name in slots if not name.startswith('_') and name not in collected)
+        names = _SLOT_NAMES[cls] = tuple(collected)
+    return names
+
+
+def _generic_serialize(obj: Any) -> Any:
+    """通用对象序列化（支持 __dict__ 与 __slots__ 对象、列表、元组、字典）"""
+    cls = type(obj)
+    if cls in _PRIMITIVE_TYPES:
+        return obj
+
+    attrs = getattr(obj, '__dict__', None)
+    if attrs is not None:
+        return {k: _generic_serialize(v) for k, v in attrs.items() if k[0] != '_'}
+
+    if isinstance(obj, (list, tuple)):
+        return [_generic_serialize(item) for item in obj]
+    if isinstance(obj, dict):
+        return {k: _generic_serialize(v) for k, v in obj.items()}
+
+    slot_names = _slot_names(cls)
+    if slot_names:
+        return {
+            name: _generic_serialize(getattr(obj, name))
+            for name in slot_names
+            if hasattr(obj, name)
+        }
+
+    return obj
+
+
+# 类型 -> 序列化函数分派表（按 type(obj) 查找；子类首次出现时沿 MRO 解析并缓存）
+try:
+    from claude_agent_sdk import (
+        AssistantMessage,
+        ResultMessage,
+        UserMessage,
+        SystemMessage,
+        TextBlock,
+        ToolUseBlock,
+        ToolResultBlock
+    )
+
+    _MESSAGE_HANDLERS: Dict[type, Callable[[Any], Any]] = {
+        AssistantMessage: _serialize_assistant,
+        ResultMessage: _serialize_result,
+        UserMessage: _serialize_user,
+        SystemMessage: _serialize_system,
+    }
+    _BLOCK_HANDLERS: Dict[type, Callable[[Any], Any]] = {
+        TextBlock: _serialize_text_block,
+        ToolUseBlock: _serialize_tool_use_block,
+        ToolResultBlock: _serialize_tool_result_block,
+    }
+except ImportError:
+    _MESSAGE_HANDLERS = {}
+    _BLOCK_HANDLERS = {}
+
+
+def _resolve_handler(
+    handlers: Dict[type, Callable[[Any], Any]],
+    cls: type,
+    default: Callable[[Any], Any]
+) -> Callable[[Any], Any]:
+    """沿 MRO 查找已注册的基类处理函数，结果缓存到分派表（未注册类型缓存 default）"""
+    for base in cls.__mro__[1:]:
+        handler = handlers.get(base)
+        if handler is not None:
+            break
+    else:
+        handler = default
+    handlers[cls] = handler
+    return handler
+
+
 class MessageSerializer:
     """消息序列化器"""
 
@@ -24,116 +200,51 @@ class MessageSerializer:
         Returns:
             消息数据字典
         """
-        message_type = type(message).__name__
+        cls = type(message)
+        handler = _MESSAGE_HANDLERS.get(cls)
+        if handler is None:
+            # 未知类型回退到通用序列化
+            handler = _resolve_handler(_MESSAGE_HANDLERS, cls, _generic_serialize)
 
         try:
-            # 导入消息类型（延迟导入避免循环依赖）
-            from claude_agent_sdk import (
-                AssistantMessage,
-                ResultMessage,
-                UserMessage,
-                SystemMessage
-            )
-
-            if isinstance(message, AssistantMessage):
-                return {
-                    "model": message.model,
-                    "content": [MessageSerializer._serialize_content_block(b) for b in message.content]
-                }
-
-            elif isinstance(message, ResultMessage):
-                return {
-                    "subtype": message.subtype,
-                    "duration_ms": message.duration_ms,
-                    "duration_api_ms": message.duration_api_ms,
-                    "is_error": message.is_error,
-                    "num_turns": message.num_turns,
-                    "session_id": getattr(message, 'session_id', None),
-                    "total_cost_usd": message.total_cost_usd,
-                    "usage": message.usage,
-                    "result": message.result
-                }
-
-            elif isinstance(message, UserMessage):
-                content = message.content
-                if isinstance(content, str):
-                    content_data = content
-                else:
-                    content_data = [MessageSerializer._serialize_content_block(b) for b in content]
-
-                return {
-                    "role": "user",
-                    "content": content_data
-                }
-
-            elif isinstance(message, SystemMessage):
-                return {
-                    "subtype": message.subtype,
-                    "data": message.data
-                }
-
-            else:
-                # 未知类型，尝试通用序列化
-                return MessageSerializer._generic_serialize(message)
-
+            return handler(message)
         except Exception as e:
+            message_type = cls.__name__
             logger.error(f"消息序列化失败 ({message_type}): {e}")
             return {
                 "error": str(e),
                 "message_type": message_type
             }
 
+    @staticmethod
+    def serialize_message_bytes(message: Any) -> bytes:
+        """
+        序列化消息对象为 JSON bytes（供直接持久化/推送的调用方使用）
+
+        Args:
+            message: Claude SDK 消息对象
+
+        Returns:
+            消息数据的 UTF-8 JSON bytes
+
+        Raises:
+            TypeError: 消息数据包含无法 JSON 序列化的值
+        """
+        return dumps_bytes(MessageSerializer.serialize_message(message))
+
     @staticmethod
     def _serialize_content_block(block: Any) -> dict:
         """序列化内容块"""
-        from claude_agent_sdk import TextBlock, ToolUseBlock, ToolResultBlock
+        cls = type(block)
+        handler = _BLOCK_HANDLERS.get(cls)
+        if handler is None:
+            handler = _resolve_handler(_BLOCK_HANDLERS, cls, _serialize_other_block)
 
         try:
-            if isinstance(block, TextBlock):
-                return {
-                    "type": "text",
-                    "text": block.text
-                }
-
-            elif isinstance(block, ToolUseBlock):
-                return {
-                    "type": "tool_use",
-                    "id": block.id,
-                    "name": block.name,
-                    "input": block.input
-                }
-
-            elif isinstance(block, ToolResultBlock):
-                return {
-                    "type": "tool_result",
-                    "tool_use_id": block.tool_use_id,
-                    "content": block.content,
-                    "is_error": block.is_error
-                }
-
-            # ThinkingBlock
-            elif hasattr(block, 'thinking'):
-                return {
-                    "type": "thinking",
-                    "thinking": block.thinking,
-                    "signature": getattr(block, 'signature', None)
-                }
-
-            else:
-                return MessageSerializer._generic_serialize(block)
-
+            return handler(block)
         except Exception as e:
             logger.error(f"内容块序列化失败: {e}")
             return {"type": "error", "error": str(e)}
 
-    @staticmethod
-    def _generic_serialize(obj: Any) -> Any:
-        """通用对象序列化"""
-        if hasattr(obj, '__dict__'):
-            return {k: MessageSerializer._generic_serialize(v) for k, v in obj.__dict__.items() if not k.startswith('_')}
-        elif isinstance(obj, (list, tuple)):
-            return [MessageSerializer._generic_serialize(item) for item in obj]
-        elif isinstance(obj, dict):
-            return {k: MessageSerializer._generic_serialize(v) for k, v in obj.items()}
-        else:
-            return obj
+    # 通用对象序列化（实现见模块级 _generic_serialize）
+    _generic_serialize = staticmethod(_generic_serialize)
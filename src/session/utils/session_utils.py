@@ -4,10 +4,10 @@
 提供会话相关的工具函数和数据类
 """
 
-import secrets
+import os
 from datetime import datetime
 from typing import Dict, Any, List, Optional
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 
 
 def generate_session_id() -> str:
@@ -20,20 +20,23 @@ def generate_session_id() -> str:
     Returns:
         会话 ID 字符串
     """
+    # 时间戳与计数器取自同一时刻
+    now = datetime.now()
+
     # ISO 8601 格式时间戳（精确到秒）
-    timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    timestamp = now.strftime("%Y%m%dT%H%M%S")
 
     # 4位数字计数器（同一秒内递增）
-    # 使用纳秒的后4位作为简单计数器
-    counter = f"{datetime.now().microsecond % 10000:04d}"
+    # 使用微秒的后4位作为简单计数器
+    counter = f"{now.microsecond % 10000:04d}"
 
-    # 8位随机十六进制字符串
-    short_hash = secrets.token_hex(4)
+    # 8位随机十六进制字符串（os.urandom 与 secrets.token_hex 同源）
+    short_hash = os.urandom(4).hex()
 
     return f"{timestamp}_{counter}_{short_hash}"
 
 
-@dataclass
+@dataclass(slots=True)
 class Statistics:
     """会话统计信息"""
     total_duration_ms: int = 0
@@ -55,5 +58,17 @@ class Statistics:
             self.subsessions = []
 
     def to_dict(self) -> dict:
-        """转换为字典"""
-        return asdict(self)
+        """转换为字典（容器字段浅拷贝，调用方修改返回值不影响统计对象）"""
+        return {
+            "total_duration_ms": self.total_duration_ms,
+            "api_duration_ms": self.api_duration_ms,
+            "num_turns": self.num_turns,
+            "num_messages": self.num_messages,
+            "num_tool_calls": self.num_tool_calls,
+            "tools_used": dict(self.tools_used),
+            "subsessions": [dict(subsession) for subsession in self.subsessions],
+            "token_usage": dict(self.token_usage) if self.token_usage is not None else None,
+            "cost_usd": self.cost_usd,
+            "final_status": self.final_status,
+            "error_count": self.error_count
+        }
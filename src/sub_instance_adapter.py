@@ -5,12 +5,55 @@
 """
 
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+from .config_manager import ConfigManager
 from .logging_config import get_logger
 from .session.utils import SessionContext
 
 logger = get_logger(__name__)
 
+# 子实例配置缓存：子实例路径 -> (config.yaml 的 mtime_ns, 配置字典)，文件修改后重新解析
+_CONFIG_CACHE: Dict[Path, Tuple[int, Dict[str, Any]]] = {}
+
+
+def _load_instance_config(instance_path: Path) -> Dict[str, Any]:
+    """
+    读取子实例配置（config.yaml 未修改时返回缓存结果）
+
+    Args:
+        instance_path: 子实例路径
+
+    Returns:
+        配置字典（只读使用）
+    """
+    mtime_ns = (instance_path / "config.yaml").stat().st_mtime_ns
+    cached = _CONFIG_CACHE.get(instance_path)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+
+    config = ConfigManager(instance_path).load_config()
+    _CONFIG_CACHE[instance_path] = (mtime_ns, config)
+    return config
+
+# 延迟解析的依赖（agent_system 导入本模块，模块级导入会形成循环依赖）
+_AgentSystem = None
+_MessageBus = None
+
+
+def _resolve_deps():
+    """
+    首次调用时导入 AgentSystem 与 MessageBus，之后直接返回缓存的类
+
+    Returns:
+        (AgentSystem, MessageBus)
+    """
+    global _AgentSystem, _MessageBus
+    if _AgentSystem is None:
+        from .agent_system import AgentSystem
+        from .session import MessageBus
+        _AgentSystem, _MessageBus = AgentSystem, MessageBus
+    return _AgentSystem, _MessageBus
+
 
 class SubInstanceTool:
     """子实例工具类"""
@@ -35,9 +78,7 @@ class SubInstanceTool:
 
         # 从配置中读取描述
         try:
-            from .config_manager import ConfigManager
-            config_loader = ConfigManager(self.instance_path)
-            config = config_loader.load_config()
+            config = _load_instance_config(self.instance_path)
             self._description = config.get("agent", {}).get("description", f"调用 {instance_name} 子实例")
         except Exception as e:
             logger.warning(f"加载子实例 {instance_name} 配置失败: {e}")
@@ -47,6 +88,23 @@ class SubInstanceTool:
         self.__name__ = self.name
         self.__doc__ = self._description
 
+    async def _get_message_bus(self):
+        """
+        获取已连接的 MessageBus
+
+        from_config() 返回当前事件循环的共享实例（引用计数 +1），
+        同一事件循环中已有持有者时直接复用其连接；调用者用完后需调用 close() 释放引用。
+
+        Returns:
+            MessageBus 实例（Redis 不可用时为未连接状态，降级运行）
+        """
+        _, MessageBus = _resolve_deps()
+        message_bus = MessageBus.from_config()
+        if not message_bus.is_connected:
+            connected = await message_bus.connect()
+            logger.info(f"[SubInstanceTool] 子实例 {self.instance_name} MessageBus 连接状态: {connected}")
+        return message_bus
+
     async def __call__(
         self,
         task: str,
@@ -73,8 +131,7 @@ class SubInstanceTool:
             无需手动传递（通过临时文件实现进程间通信）
         """
         try:
-            # 延迟导入避免循环依赖
-            from .agent_system import AgentSystem
+            AgentSystem, _ = _resolve_deps()
 
             # ✅ 自动从临时文件读取 parent_session_id
             parent_session_id = SessionContext.get_current_session()
@@ -91,14 +148,15 @@ class SubInstanceTool:
                 }
 
             # 创建 AgentSystem
-            # 🔥 传递父实例的 MessageBus 以实现实时消息传递
-            from .session import MessageBus
-            message_bus = MessageBus.from_config()
-            connected = await message_bus.connect()
-            logger.info(f"[SubInstanceTool] 子实例 {self.instance_name} MessageBus 连接状态: {connected}")
+            # 🔥 传递父实例的 MessageBus 以实现实时消息传递（共享实例，调用结束后释放引用）
+            message_bus = await self._get_message_bus()
 
-            agent = AgentSystem(str(self.instance_path), message_bus=message_bus)
-            await agent.initialize()
+            try:
+                agent = AgentSystem(str(self.instance_path), message_bus=message_bus)
+                await agent.initialize()
+            except BaseException:
+                await message_bus.close()
+                raise
             logger.info(f"[SubInstanceTool] 子实例 {self.instance_name} AgentSystem 初始化完成")
 
             try:
@@ -107,10 +165,9 @@ class SubInstanceTool:
 
                 # 添加上下文文件
                 if context_files:
-                    file_info = "\n相关文件:\n"
-                    for file_path in context_files:
-                        file_info += f"- {file_path}\n"
-                    prompt_parts.append(file_info)
+                    prompt_parts.append(
+                        "\n相关文件:\n" + "".join(f"- {file_path}\n" for file_path in context_files)
+                    )
 
                 # 添加输出格式要求
                 if output_format != "text":
@@ -118,10 +175,9 @@ class SubInstanceTool:
 
                 # 添加变量
                 if variables:
-                    vars_info = "\n变量:\n"
-                    for key, value in variables.items():
-                        vars_info += f"- {key}: {value}\n"
-                    prompt_parts.append(vars_info)
+                    prompt_parts.append(
+                        "\n变量:\n" + "".join(f"- {key}: {value}\n" for key, value in variables.items())
+                    )
 
                 # 组合提示词
                 prompt = "\n".join(prompt_parts)
@@ -147,7 +203,7 @@ class SubInstanceTool:
                 }
 
             finally:
-                # 清理资源
+                # 清理资源（释放 MessageBus 引用，最后一个持有者释放时才关闭连接）
                 agent.cleanup()
                 await message_bus.close()
 
@@ -6,12 +6,16 @@
 - 子实例工具
 """
 
+import os
+import re
 import sys
 import importlib
 import importlib.util
 import inspect
+from fnmatch import translate
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Optional, List
+from typing import Any, Dict, Optional, List, Tuple
 
 from .error_handling import ToolError
 from .logging_config import get_logger
@@ -21,6 +25,22 @@ from .mcp_server.tool_loader import SimpleToolLoader, load_tools_from_instance
 logger = get_logger(__name__)
 
 
+@lru_cache(maxsize=256)
+def _compile_globs(patterns: Tuple[str, ...]) -> "re.Pattern[str]":
+    """
+    将一组通配符模式编译为单个正则（任一模式匹配即匹配）
+
+    与 fnmatch.fnmatch 语义一致：模式和待匹配名称都需经过 os.path.normcase。
+
+    Args:
+        patterns: 通配符模式元组
+
+    Returns:
+        编译后的正则对象
+    """
+    return re.compile("|".join(f"(?:{translate(os.path.normcase(p))})" for p in patterns))
+
+
 class ToolManager:
     """工具管理器"""
 
@@ -38,8 +58,9 @@ class ToolManager:
         self._process_manager = None
         self._server_config: Optional[Dict[str, Any]] = None
 
-        # 工具名称缓存
+        # 工具名称缓存（及带 MCP 前缀的完整名称，discover_tools 时一并生成）
         self._tool_names: list[str] = []
+        self._tool_names_prefixed: Tuple[str, ...] = ()
 
     def discover_tools(self) -> List[str]:
         """
@@ -51,6 +72,7 @@ class ToolManager:
         if not self.tools_dir.exists():
             logger.info(f"工具目录不存在: {self.tools_dir}")
             self._tool_names = []
+            self._tool_names_prefixed = ()
             return []
 
         logger.info(f"检查工具目录: {self.tools_dir}")
@@ -59,6 +81,7 @@ class ToolManager:
             # 加载本地工具
             _, local_tool_names = load_tools_from_instance(self.instance_path)
             self._tool_names = local_tool_names
+            self._tool_names_prefixed = tuple(f"mcp__custom_tools__{name}" for name in local_tool_names)
 
             # TODO: 如果需要，也可以在这里添加其他类型的工具
             logger.info(f"发现 {len(self._tool_names)} 个工具")
@@ -152,24 +175,28 @@ class ToolManager:
         Returns:
             过滤后的工具名称列表（包含 mcp__custom_tools__ 前缀）
         """
-        # 添加 MCP 前缀
-        tool_names = [f"mcp__custom_tools__{name}" for name in self._tool_names]
+        # 带 MCP 前缀的名称在 discover_tools 时已生成
+        tool_names = self._tool_names_prefixed
 
         if allowed is None and disallowed is None:
-            return tool_names
+            return list(tool_names)
 
-        from fnmatch import fnmatch
+        # 每组模式只编译一次，每个工具各匹配一次
+        disallowed_re = _compile_globs(tuple(disallowed)) if disallowed else None
+        allowed_re = _compile_globs(tuple(allowed)) if allowed else None
         filtered = []
 
         for tool_name in tool_names:
+            normalized_name = os.path.normcase(tool_name)
+
             # 检查是否在禁止列表中
-            if disallowed and any(fnmatch(tool_name, pattern) for pattern in disallowed):
+            if disallowed_re is not None and disallowed_re.match(normalized_name):
                 logger.debug(f"工具 {tool_name} 在禁止列表中，已过滤")
                 continue
 
             # 如果有允许列表，检查是否在允许列表中
-            if allowed:
-                if any(fnmatch(tool_name, pattern) for pattern in allowed):
+            if allowed_re is not None:
+                if allowed_re.match(normalized_name):
                     filtered.append(tool_name)
                 else:
                     logger.debug(f"工具 {tool_name} 不在允许列表中，已过滤")
@@ -189,20 +216,13 @@ class ToolManager:
         Returns:
             所有 MCP 工具名称列表
         """
-        all_tool_names = []
-
-        # 1. 收集本地自定义工具
-        local_tool_names = self.get_tool_names()
-        for tool_name in local_tool_names:
-            full_name = f"mcp__custom_tools__{tool_name}"
-            all_tool_names.append(full_name)
-        logger.debug(f"收集到 {len(local_tool_names)} 个本地工具")
+        # 1. 收集本地自定义工具（带前缀名称已缓存）
+        all_tool_names = list(self._tool_names_prefixed)
+        logger.debug(f"收集到 {len(all_tool_names)} 个本地工具")
 
         # 2. 收集子实例工具（现在是主 MCP 服务器的一部分）
         if sub_instance_tools:
-            for tool in sub_instance_tools:
-                full_name = f"mcp__custom_tools__{tool.name}"
-                all_tool_names.append(full_name)
+            all_tool_names.extend(f"mcp__custom_tools__{tool.name}" for tool in sub_instance_tools)
             logger.debug(f"收集到 {len(sub_instance_tools)} 个子实例工具")
 
         logger.info(f"总共收集到 {len(all_tool_names)} 个 MCP 工具")
@@ -220,43 +240,31 @@ class ToolManager:
             options_dict: ClaudeAgentOptions 配置字典
             all_mcp_tool_names: 所有 MCP 工具名称列表
         """
-        from fnmatch import fnmatch
-
-        # 展开 allowed_tools
-        if "allowed_tools" in options_dict:
-            allowed_patterns = options_dict["allowed_tools"]
-            expanded_allowed = []
-
-            for pattern in allowed_patterns:
-                if "*" in pattern or "?" in pattern:
-                    # 通配符模式，需要展开
-                    matched = [name for name in all_mcp_tool_names if fnmatch(name, pattern)]
-                    expanded_allowed.extend(matched)
-                    logger.debug(f"通配符 '{pattern}' 匹配到 {len(matched)} 个工具")
-                else:
-                    # 具体工具名，直接添加
-                    expanded_allowed.append(pattern)
-
-            options_dict["allowed_tools"] = expanded_allowed
-            logger.info(f"展开后的 allowed_tools 包含 {len(expanded_allowed)} 个工具")
-
-        # 展开 disallowed_tools
-        if "disallowed_tools" in options_dict:
-            disallowed_patterns = options_dict["disallowed_tools"]
-            expanded_disallowed = []
-
-            for pattern in disallowed_patterns:
-                if "*" in pattern or "?" in pattern:
-                    # 通配符模式，需要展开
-                    matched = [name for name in all_mcp_tool_names if fnmatch(name, pattern)]
-                    expanded_disallowed.extend(matched)
-                    logger.debug(f"通配符 '{pattern}' 匹配到 {len(matched)} 个工具")
-                else:
-                    # 具体工具名，直接添加
-                    expanded_disallowed.append(pattern)
+        normalized_names: Optional[List[Tuple[str, str]]] = None
+
+        for key in ("allowed_tools", "disallowed_tools"):
+            if key not in options_dict:
+                continue
+
+            patterns = options_dict[key]
+            wildcards = [pattern for pattern in patterns if "*" in pattern or "?" in pattern]
+            if not wildcards:
+                # 全部是具体工具名，无需展开
+                logger.info(f"展开后的 {key} 包含 {len(patterns)} 个工具")
+                continue
+
+            if normalized_names is None:
+                normalized_names = [(os.path.normcase(name), name) for name in all_mcp_tool_names]
+
+            # 具体工具名直接保留，所有通配符合并为一个正则，对工具列表只扫描一次（结果去重）
+            wildcard_re = _compile_globs(tuple(wildcards))
+            expanded = dict.fromkeys(pattern for pattern in patterns if pattern not in wildcards)
+            matched = [name for normalized, name in normalized_names if wildcard_re.match(normalized)]
+            expanded.update(dict.fromkeys(matched))
+            logger.debug(f"通配符 {wildcards} 匹配到 {len(matched)} 个工具")
 
-            options_dict["disallowed_tools"] = expanded_disallowed
-            logger.info(f"展开后的 disallowed_tools 包含 {len(expanded_disallowed)} 个工具")
+            options_dict[key] = list(expanded)
+            logger.info(f"展开后的 {key} 包含 {len(expanded)} 个工具")
 
     @property
     def tools_count(self) -> int:
@@ -8,16 +8,276 @@
 - 监控工作目录大小
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, FrozenSet, Iterator, List, Tuple
 from datetime import datetime
-import json
+import errno
+import os
 import shutil
+import stat
+import time
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from ..json_utils import dumps_bytes, loads as json_loads
 from ..logging_config import get_logger
+from ..session.storage.session_index import SessionIndex
 
 logger = get_logger(__name__)
 
+# 一天对应的纳秒数（用于整数运算计算工作目录年龄）
+_NS_PER_DAY = 86_400 * 1_000_000_000
+
+# 文件复制缓冲区大小（256KB，较 shutil 默认值减少 read/write 系统调用次数）
+_COPY_BUFFER_SIZE = 256 * 1024
+
+# 启用线程池并发复制的最小文件数（文件较少时建池开销大于并发收益）
+_PARALLEL_COPY_MIN_FILES = 32
+
+# copy_file_range 单次调用的最大字节数（Linux 4.5+ 可用）
+_COPY_FILE_RANGE_CHUNK = 1024 * 1024 * 1024
+
+# copy_file_range 不可用时回退到用户态复制的错误码（跨文件系统、内核或文件系统不支持）
+_COPY_FILE_RANGE_FALLBACK_ERRNOS = frozenset(
+    code for code in (
+        errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+        getattr(errno, "ENOTSUP", None), errno.EBADF,
+    ) if code is not None
+)
+
+
+def _copy_file_fast(src: str, dst: str) -> None:
+    """
+    复制单个文件内容
+
+    优先使用 os.copy_file_range 在内核内完成复制（支持 reflink 的文件系统上为 CoW 复制），
+    不可用时回退到 256KB 缓冲区的 copyfileobj。
+
+    Args:
+        src: 源文件路径
+        dst: 目标文件路径
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if hasattr(os, "copy_file_range"):
+            try:
+                infd, outfd = fsrc.fileno(), fdst.fileno()
+                while os.copy_file_range(infd, outfd, _COPY_FILE_RANGE_CHUNK) > 0:
+                    pass
+                return
+            except OSError as e:
+                if e.errno not in _COPY_FILE_RANGE_FALLBACK_ERRNOS:
+                    raise
+                # 未复制完的部分从当前文件偏移处继续用户态复制
+
+        shutil.copyfileobj(fsrc, fdst, length=_COPY_BUFFER_SIZE)
+
+
+# Linux FICLONE ioctl 请求码（btrfs/XFS 等文件系统上的 reflink 克隆）
+_FICLONE = 0x40049409
+
+# .claude 种子文件的创建方式
+SEED_MODES = ("copy", "reflink", "hardlink")
+
+
+def _reflink_file(src: str, dst: str) -> bool:
+    """
+    尝试以 reflink（FICLONE）方式克隆文件
+
+    Returns:
+        是否克隆成功（失败时目标文件可能已被创建，由后续复制覆盖）
+    """
+    if fcntl is None:
+        return False
+
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        return False
+
+
+def _link_or_copy(src: str, dst: str, seed_mode: str = "copy") -> bool:
+    """
+    按种子模式创建文件：hardlink 依次尝试硬链接、reflink、复制；reflink 尝试克隆后复制
+
+    Args:
+        src: 源文件路径
+        dst: 目标文件路径
+        seed_mode: copy / reflink / hardlink
+
+    Returns:
+        是否为硬链接（硬链接与源文件共享 inode，无需恢复元数据）
+    """
+    # 先删除已存在的目标文件：它可能是之前以 hardlink 模式创建的、与实例 .claude 共享 inode 的文件，
+    # 直接以 "wb" 打开会截断实例中的源文件
+    try:
+        os.unlink(dst)
+    except FileNotFoundError:
+        pass
+
+    if seed_mode == "hardlink":
+        try:
+            os.link(src, dst)
+            return True
+        except OSError:
+            # 跨文件系统（EXDEV）、无权限（EPERM）或链接数上限等，回退到 reflink/复制
+            pass
+
+    if seed_mode in ("reflink", "hardlink") and _reflink_file(src, dst):
+        return False
+
+    _copy_file_fast(src, dst)
+    return False
+
+
+def _copy_entry(job: Tuple[str, str, os.stat_result], seed_mode: str = "copy") -> None:
+    """复制单个文件，并按源文件 stat 恢复权限与访问/修改时间"""
+    src, dst, st = job
+    if _link_or_copy(src, dst, seed_mode):
+        return
+
+    os.chmod(dst, stat.S_IMODE(st.st_mode))
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def _collect_copy_jobs(src: str, dst: str, jobs: List[Tuple[str, str, os.stat_result]]) -> None:
+    """递归创建目标目录，并收集待复制的 (源文件, 目标文件, stat) 列表"""
+    os.makedirs(dst, exist_ok=True)
+
+    with os.scandir(src) as it:
+        for entry in it:
+            target = os.path.join(dst, entry.name)
+            if entry.is_dir():
+                _collect_copy_jobs(entry.path, target, jobs)
+            elif entry.is_file():
+                jobs.append((entry.path, target, entry.stat()))
+
+
+def _fast_copytree(src: str, dst: str, workers: int = 1, seed_mode: str = "copy") -> None:
+    """
+    递归复制目录（基于 os.scandir）
+
+    复用 DirEntry 缓存的类型与 stat 信息，避免 copytree/copy2 对每个条目的重复 stat。
+    与 copytree 默认行为一致：跟随符号链接复制其内容，保留文件权限与访问/修改时间。
+
+    先顺序创建全部目标目录，再复制文件；workers > 1 且文件数不少于 _PARALLEL_COPY_MIN_FILES 时
+    使用线程池并发复制（文件 I/O 期间释放 GIL，可重叠大量小文件的 open/close 延迟）。
+
+    Args:
+        src: 源目录
+        dst: 目标目录（已存在时合并写入）
+        workers: 并发复制线程数（<= 1 时顺序复制）
+        seed_mode: 文件创建方式（copy / reflink / hardlink，见 _link_or_copy）
+    """
+    jobs: List[Tuple[str, str, os.stat_result]] = []
+    _collect_copy_jobs(src, dst, jobs)
+
+    copy_entry = partial(_copy_entry, seed_mode=seed_mode)
+    if workers > 1 and len(jobs) >= _PARALLEL_COPY_MIN_FILES:
+        with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            # 消费结果以传播复制异常
+            for _ in executor.map(copy_entry, jobs):
+                pass
+    else:
+        for job in jobs:
+            copy_entry(job)
+
+
+def _native_copytree(src: str, dst: str) -> bool:
+    """
+    使用系统复制工具复制目录（Windows: robocopy，其他平台: rsync）
+
+    Args:
+        src: 源目录
+        dst: 目标目录
+
+    Returns:
+        是否复制成功（工具不存在或执行失败时返回 False，由调用方回退到 Python 实现）
+    """
+    if os.name == "nt":
+        executable = shutil.which("robocopy")
+        # robocopy 返回码 < 8 表示成功（1 = 有文件被复制）
+        cmd = [executable, os.fspath(src), os.fspath(dst), "/E", "/MT:64", "/NFL", "/NDL", "/NJH", "/NJS"]
+        max_ok_code = 7
+    else:
+        executable = shutil.which("rsync")
+        # --copy-links 与 copytree 默认行为一致：复制符号链接指向的内容
+        cmd = [executable, "-a", "--copy-links", "-q", os.fspath(src) + "/", os.fspath(dst) + "/"]
+        max_ok_code = 0
+
+    if not executable:
+        return False
+
+    # 仅在启用 use_native_copy 时使用，延迟导入
+    import subprocess
+
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+    except OSError as e:
+        logger.debug(f"系统复制工具执行失败: {e}")
+        return False
+
+    return result.returncode <= max_ok_code
+
+
+def _metadata_created_at_ns(metadata: Dict[str, Any]) -> int:
+    """
+    读取工作目录元数据中的创建时间（纳秒时间戳）
+
+    旧版本元数据只有 ISO 格式的 created_at，此时回退为解析该字段。
+    """
+    created_at_ns = metadata.get("created_at_ns")
+    if created_at_ns is not None:
+        return created_at_ns
+
+    return int(datetime.fromisoformat(metadata["created_at"]).timestamp() * 1_000_000_000)
+
+
+def _iter_file_sizes(path: Path, exclude: FrozenSet[str] = frozenset()) -> Iterator[int]:
+    """
+    逐个产出目录内文件的字节数（基于 os.scandir 的显式栈遍历）
+
+    直接使用 DirEntry 缓存的类型与 stat 信息，不跟随符号链接。
+
+    Args:
+        path: 目录路径
+        exclude: 需要跳过的顶层条目名称
+
+    Yields:
+        文件字节数
+    """
+    stack = [(os.fspath(path), exclude)]
+    while stack:
+        dir_path, skip_names = stack.pop()
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if entry.name in skip_names:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, frozenset()))
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.stat(follow_symlinks=False).st_size
+
+
+def _dir_size_bytes(path: Path, exclude: FrozenSet[str] = frozenset()) -> int:
+    """
+    计算目录内文件总字节数
+
+    Args:
+        path: 目录路径
+        exclude: 需要跳过的顶层条目名称
+
+    Returns:
+        文件总字节数
+    """
+    return sum(_iter_file_sizes(path, exclude))
+
 
 class WorkspaceManager:
     """工作空间管理器 - 管理 session 级别的独立工作目录"""
@@ -34,6 +294,34 @@ class WorkspaceManager:
         self.config = workspace_config
         self.enabled = workspace_config.get("enabled", False)
 
+        # 常用路径（避免每次调用重复拼接）
+        self._sessions_root = instance_path / "sessions"
+        self._claude_dir = instance_path / ".claude"
+
+        self.seed_mode = workspace_config.get("seed_mode", "copy")
+        if self.seed_mode not in SEED_MODES:
+            logger.warning(f"未知的 seed_mode: {self.seed_mode}，使用 copy")
+            self.seed_mode = "copy"
+        self._seed_mode_warned = False
+
+        # 保留天数与消息模板（使用自定义模板或默认模板）在初始化时解析一次
+        self._retention_days = workspace_config.get("retention_days", 30)
+        self._template = workspace_config.get("init_message_template") or self._get_default_template()
+
+        # 工作目录创建时间索引（与 sessions_index.jsonl 同级）
+        self._workspace_index = SessionIndex(
+            instance_path / "workspace_index.jsonl", value_key="created_at_ns"
+        )
+
+        # 不计入工作目录大小的顶层条目：元数据文件；硬链接模式下 .claude 与实例目录共享数据
+        self._size_exclude = frozenset(
+            {".workspace_info.json", ".claude"} if self.seed_mode == "hardlink"
+            else {".workspace_info.json"}
+        )
+
+        # 工作目录大小缓存：session_id -> (计算时刻, 工作目录 mtime_ns, 字节数)
+        self._size_cache: Dict[str, Tuple[float, int, int]] = {}
+
     def create_workspace(self, session_id: str) -> Optional[Path]:
         """
         为 session 创建工作目录
@@ -48,28 +336,29 @@ class WorkspaceManager:
             return None
 
         # 固定路径：sessions/{session_id}/workspace/
-        workspace_path = self.instance_path / "sessions" / session_id / "workspace"
+        workspace_path = self._sessions_root / session_id / "workspace"
 
         # 创建目录
         if self.config.get("auto_create", True):
             workspace_path.mkdir(parents=True, exist_ok=True)
 
-            # 写入元数据
+            # 写入元数据（created_at 供阅读，created_at_ns 供清理时整数运算）
+            created_at_ns = time.time_ns()
             metadata = {
                 "session_id": session_id,
-                "created_at": datetime.now().isoformat(),
-                "retention_days": self.config.get("retention_days", 30),
+                "created_at": datetime.fromtimestamp(created_at_ns / 1_000_000_000).isoformat(),
+                "created_at_ns": created_at_ns,
+                "retention_days": self._retention_days,
                 "max_size_mb": self.config.get("max_size_mb", 500)
             }
 
             metadata_file = workspace_path / ".workspace_info.json"
-            with open(metadata_file, "w", encoding="utf-8") as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
+            metadata_file.write_bytes(dumps_bytes(metadata, indent=True))
+            self._workspace_index.append(session_id, created_at_ns)
 
             # 🌟 复制 .claude 目录下的所有文件到工作空间
-            claude_dir = self.instance_path / ".claude"
-            if claude_dir.exists():
-                self._copy_claude_directory(claude_dir, workspace_path)
+            if self._claude_dir.exists():
+                self._copy_claude_directory(self._claude_dir, workspace_path)
 
             logger.info(f"创建工作目录: {workspace_path}")
 
@@ -88,40 +377,156 @@ class WorkspaceManager:
         if not self.enabled:
             return None
 
-        return self.instance_path / "sessions" / session_id / "workspace"
+        return self._sessions_root / session_id / "workspace"
 
-    def cleanup_old_workspaces(self, retention_days: Optional[int] = None) -> Dict[str, Any]:
+    def cleanup_old_workspaces(
+        self,
+        retention_days: Optional[int] = None,
+        sample_fraction: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
         清理过期的工作目录（手动调用）
 
+        sample_fraction < 1 时每次只随机检查该比例的工作目录，
+        周期性调用时每个工作目录平均在 1/sample_fraction 次内被检查到。
+
         Args:
             retention_days: 保留天数（None 则使用配置值）
+            sample_fraction: 抽样比例，取值 (0, 1]（None 则使用配置值，默认 1.0 全量检查）
 
         Returns:
             清理报告，包含以下字段：
-                - scanned: 扫描的工作目录数量
+                - scanned: 索引中参与检查的工作目录总数（抽样时为抽样数量）
+                - expired: 已过期的工作目录数量（按创建时间从旧到新逐个处理，遇到未过期的即停止）
                 - deleted: 删除的工作目录数量
                 - failed: 删除失败的数量
                 - total_size_mb: 释放的总空间（MB）
                 - deleted_sessions: 已删除的会话列表
         """
         if retention_days is None:
-            retention_days = self.config.get("retention_days", 30)
+            retention_days = self._retention_days
+        if sample_fraction is None:
+            sample_fraction = self.config.get("cleanup_sample_fraction", 1.0)
 
         report = {
             "scanned": 0,
+            "expired": 0,
             "deleted": 0,
             "failed": 0,
             "total_size_mb": 0.0,
             "deleted_sessions": []
         }
 
-        sessions_dir = self.instance_path / "sessions"
+        sessions_dir = self._sessions_root
         if not sessions_dir.exists():
             return report
 
-        # 扫描所有 session 目录
-        for session_dir in sessions_dir.iterdir():
+        # 读取工作目录创建时间索引；索引不存在时全量扫描一次并重建
+        # （持锁期间 create_workspace 的追加会等待，重建完成后再写入，不会遗漏）
+        with self._workspace_index.locked():
+            index_entries = self._workspace_index.load()
+            # 索引不存在、含无法解析的行或非整数时间值（旧格式记录）时全量扫描重建，迁移为 created_at_ns
+            if (
+                index_entries is None
+                or self._workspace_index.skipped_lines
+                or not all(isinstance(created_at_ns, int) for created_at_ns in index_entries.values())
+            ):
+                # 按创建时间排序后写入，使索引文件保持从旧到新的顺序
+                index_entries = dict(
+                    sorted(self._scan_workspace_created_times(report).items(), key=lambda item: item[1])
+                )
+                self._workspace_index.rebuild(index_entries)
+
+        candidates = list(index_entries.items())
+
+        if sample_fraction < 1.0 and candidates:
+            import random
+
+            candidates = random.sample(candidates, max(1, int(len(candidates) * sample_fraction)))
+
+        # 按创建时间从旧到新处理，遇到首个未过期的即停止：
+        # age_days > retention_days 等价于 created_at_ns <= now_ns - (retention_days + 1) 天
+        # （索引按追加顺序即创建顺序排列，重建时也按时间排序写入，timsort 对已有序数据只需线性比较）
+        candidates.sort(key=lambda item: item[1])
+        now_ns = time.time_ns()
+        cutoff_ns = now_ns - (retention_days + 1) * _NS_PER_DAY
+
+        report["scanned"] = len(candidates)
+
+        removed_ids = []
+        expired = []
+        for session_id, created_at_ns in candidates:
+            if created_at_ns > cutoff_ns:
+                break
+
+            report["expired"] += 1
+            workspace_dir = sessions_dir / session_id / "workspace"
+
+            try:
+                age_days = (now_ns - created_at_ns) // _NS_PER_DAY
+
+                # 工作目录已被外部删除，仅从索引中移除
+                if not workspace_dir.is_dir():
+                    removed_ids.append(session_id)
+                    continue
+
+                # 计算大小
+                size_bytes = self._workspace_size_bytes(session_id, workspace_dir)
+                expired.append((session_id, workspace_dir, age_days, size_bytes / (1024 * 1024)))
+
+            except Exception as e:
+                logger.error(f"处理工作目录失败 {workspace_dir}: {e}")
+                report["failed"] += 1
+
+        # 删除过期工作目录（各目录互不相关，按 cleanup_workers 并发删除）
+        errors = []
+        if expired:
+            workers = max(1, min(self.config.get("cleanup_workers", 8), len(expired)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(self._remove_workspace, session_id, workspace_dir, size_mb)
+                    for session_id, workspace_dir, _, size_mb in expired
+                ]
+                errors = [future.exception() for future in futures]
+
+        for (session_id, workspace_dir, age_days, size_mb), error in zip(expired, errors):
+            if error is not None:
+                logger.error(f"处理工作目录失败 {workspace_dir}: {error}")
+                report["failed"] += 1
+                continue
+
+            removed_ids.append(session_id)
+            report["deleted"] += 1
+            report["total_size_mb"] += size_mb
+            report["deleted_sessions"].append({
+                "session_id": session_id,
+                "age_days": age_days,
+                "size_mb": size_mb
+            })
+
+        # 从索引中移除已删除的工作目录
+        self._workspace_index.remove(removed_ids)
+
+        return report
+
+    def _remove_workspace(self, session_id: str, workspace_dir: Path, size_mb: float) -> None:
+        """删除单个工作目录（可在线程池中执行）"""
+        shutil.rmtree(workspace_dir)
+        self._size_cache.pop(session_id, None)
+        logger.info(f"已删除过期工作目录: {workspace_dir} ({size_mb:.2f} MB)")
+
+    def _scan_workspace_created_times(self, report: Dict[str, Any]) -> Dict[str, int]:
+        """
+        全量扫描工作目录元数据，收集创建时间（用于重建索引）
+
+        Args:
+            report: 清理报告（元数据读取失败时累加 failed）
+
+        Returns:
+            session_id -> created_at_ns 映射
+        """
+        created_times: Dict[str, int] = {}
+        for session_dir in self._sessions_root.iterdir():
             if not session_dir.is_dir():
                 continue
 
@@ -129,8 +534,6 @@ class WorkspaceManager:
             if not workspace_dir.exists():
                 continue
 
-            report["scanned"] += 1
-
             # 检查元数据
             metadata_file = workspace_dir / ".workspace_info.json"
             if not metadata_file.exists():
@@ -138,38 +541,13 @@ class WorkspaceManager:
                 continue
 
             try:
-                with open(metadata_file, "r", encoding="utf-8") as f:
-                    metadata = json.load(f)
-
-                created_at = datetime.fromisoformat(metadata["created_at"])
-                age_days = (datetime.now() - created_at).days
-
-                if age_days > retention_days:
-                    # 计算大小
-                    size_bytes = sum(
-                        f.stat().st_size
-                        for f in workspace_dir.rglob("*")
-                        if f.is_file()
-                    )
-                    size_mb = size_bytes / (1024 * 1024)
-
-                    # 删除工作目录
-                    shutil.rmtree(workspace_dir)
-                    logger.info(f"已删除过期工作目录: {workspace_dir} ({size_mb:.2f} MB)")
-
-                    report["deleted"] += 1
-                    report["total_size_mb"] += size_mb
-                    report["deleted_sessions"].append({
-                        "session_id": session_dir.name,
-                        "age_days": age_days,
-                        "size_mb": size_mb
-                    })
-
+                metadata = json_loads(metadata_file.read_bytes())
+                created_times[session_dir.name] = _metadata_created_at_ns(metadata)
             except Exception as e:
                 logger.error(f"处理工作目录失败 {workspace_dir}: {e}")
                 report["failed"] += 1
 
-        return report
+        return created_times
 
     def get_workspace_info_message(self, session_id: str) -> str:
         """
@@ -184,44 +562,48 @@ class WorkspaceManager:
         if not self.enabled:
             return ""
 
-        workspace_path = self.get_workspace_path(session_id)
-
-        # 使用自定义模板或默认模板
-        template = self.config.get("init_message_template")
-        if not template:
-            template = self._get_default_template()
-
         # 填充模板
-        message = template.format(
-            workspace_path=workspace_path,
-            retention_days=self.config.get("retention_days", 30)
+        return self._template.format(
+            workspace_path=self.get_workspace_path(session_id),
+            retention_days=self._retention_days
         )
 
-        return message
-
     def _copy_claude_directory(self, source_dir: Path, dest_dir: Path) -> None:
         """
         复制 .claude 目录下的所有文件到工作空间
 
+        文件创建方式由 seed_mode 配置决定（copy / reflink / hardlink）。
+
         Args:
             source_dir: 源目录 (.claude)
             dest_dir: 目标目录 (workspace)
         """
         try:
-            import shutil
-
-            # 创建目标目录中的 .claude 子目录
+            if self.seed_mode == "hardlink" and not self._seed_mode_warned:
+                logger.warning(
+                    "workspace.seed_mode=hardlink: 工作空间中的 .claude 文件与实例目录共享数据，"
+                    "原地修改会影响实例配置"
+                )
+                self._seed_mode_warned = True
+
+            # 递归复制所有文件和子目录到目标目录中的 .claude 子目录
             claude_dest_dir = dest_dir / ".claude"
-            claude_dest_dir.mkdir(exist_ok=True)
 
-            # 递归复制所有文件和子目录
-            for item in source_dir.iterdir():
-                if item.is_file():
-                    # 复制文件
-                    shutil.copy2(item, claude_dest_dir / item.name)
-                elif item.is_dir():
-                    # 复制整个目录
-                    shutil.copytree(item, claude_dest_dir / item.name, dirs_exist_ok=True)
+            # 可选：使用 robocopy/rsync 复制（仅 copy 模式），失败时回退到 Python 实现
+            if (
+                self.seed_mode == "copy"
+                and self.config.get("use_native_copy", False)
+                and _native_copytree(source_dir, claude_dest_dir)
+            ):
+                logger.debug(f"已复制 .claude 目录到工作空间: {claude_dest_dir}")
+                return
+
+            _fast_copytree(
+                source_dir,
+                claude_dest_dir,
+                workers=self.config.get("parallel_copy_workers", 8),
+                seed_mode=self.seed_mode
+            )
 
             logger.debug(f"已复制 .claude 目录到工作空间: {claude_dest_dir}")
 
@@ -259,11 +641,7 @@ Your dedicated workspace directory is: `{workspace_path}`
             return {"size_mb": 0.0, "exceeded": False, "warn": False}
 
         # 计算大小
-        size_bytes = sum(
-            f.stat().st_size
-            for f in workspace_path.rglob("*")
-            if f.is_file()
-        )
+        size_bytes = self._workspace_size_bytes(session_id, workspace_path)
         size_mb = size_bytes / (1024 * 1024)
 
         max_size = self.config.get("max_size_mb", 500)
@@ -274,3 +652,56 @@ Your dedicated workspace directory is: `{workspace_path}`
             "exceeded": size_mb > max_size,
             "warn": size_mb > warn_size
         }
+
+    def check_workspace_exceeded(self, session_id: str) -> bool:
+        """
+        检查工作目录是否超过最大限制
+
+        只需要布尔结果时使用：累计大小一旦超过 max_size_mb 即停止遍历。
+        需要精确大小时使用 check_workspace_size。
+
+        Args:
+            session_id: 会话 ID
+
+        Returns:
+            是否超过最大限制
+        """
+        workspace_path = self.get_workspace_path(session_id)
+        if not workspace_path or not workspace_path.exists():
+            return False
+
+        limit_bytes = self.config.get("max_size_mb", 500) * 1024 * 1024
+        total = 0
+        for size in _iter_file_sizes(workspace_path, self._size_exclude):
+            total += size
+            if total > limit_bytes:
+                return True
+
+        return False
+
+    def _workspace_size_bytes(self, session_id: str, workspace_path: Path) -> int:
+        """
+        计算工作目录大小（带短期缓存）
+
+        缓存在 size_cache_ttl 秒内有效，且工作目录 mtime 变化（顶层增删文件）时立即失效。
+        仅凭目录 mtime 无法感知子目录或已有文件的改动，因此不做永久缓存。
+
+        Args:
+            session_id: 会话 ID
+            workspace_path: 工作目录路径
+
+        Returns:
+            工作目录内文件总字节数
+        """
+        ttl = self.config.get("size_cache_ttl", 5)
+        mtime_ns = workspace_path.stat().st_mtime_ns
+        now = time.monotonic()
+
+        cached = self._size_cache.get(session_id)
+        if cached and now - cached[0] < ttl and cached[1] == mtime_ns:
+            return cached[2]
+
+        size_bytes = _dir_size_bytes(workspace_path, self._size_exclude)
+        if ttl > 0:
+            self._size_cache[session_id] = (now, mtime_ns, size_bytes)
+        return size_bytes